@@ -0,0 +1,4 @@
+# pylint: disable=undefined-variable
+# type: ignore
+c.InlineBackend.figure_formats = {'retina'}
+c.IPKernelApp.extensions = ['mindlab.magics']
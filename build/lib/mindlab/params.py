@@ -0,0 +1,134 @@
+import re
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from google.cloud.bigquery import ArrayQueryParameter, ScalarQueryParameter
+
+# Note: the order matters as bool is a subclass of int and datetime is a subclass of date
+BIGQUERY_TYPES: list[tuple[type | tuple[type, ...], str]] = [
+    ((bool, np.bool_), 'BOOL'),
+    ((int, np.integer), 'INT64'),
+    ((float, np.floating), 'FLOAT64'),
+    (Decimal, 'NUMERIC'),
+    (str, 'STRING'),
+    (bytes, 'BYTES'),
+    (datetime, 'DATETIME'),
+    (date, 'DATE'),
+    (time, 'TIME'),
+]
+ARRAY_TYPES = (list, tuple, set, frozenset, np.ndarray, pd.Series, pd.Index)
+
+BigQueryParameter = ScalarQueryParameter | ArrayQueryParameter
+
+# Tokens in which parameter markers must not be replaced
+_SKIPPED_TOKENS = [
+    r"'(?:[^'\\]|\\.|'')*'",  # string literals
+    r'"(?:[^"\\]|\\.|"")*"',  # quoted identifiers
+    r'`(?:[^`\\]|\\.)*`',  # BigQuery quoted identifiers
+    r'--[^\n]*',  # line comments
+    r'/\*.*?\*/',  # block comments
+    r'::',  # type casts
+    r'@@\w+',  # BigQuery system variables
+]
+_TOKEN_PATTERN = {
+    prefix: re.compile(
+        '|'.join([*_SKIPPED_TOKENS, fr'(?<![\w{prefix}]){prefix}(?P<name>[A-Za-z_]\w*)', '%']),
+        flags=re.DOTALL,
+    )
+    for prefix in ['@', ':']
+}
+
+
+def _parameter_value(name: str, namespace: Mapping[str, Any]) -> Any:
+    if name not in namespace:
+        raise ValueError(f'Query parameter "{name}" is not defined')
+    return namespace[name]
+
+
+def find_parameters(sql: str, prefix: str) -> list[str]:
+    """
+    Return the names of the parameters referenced in a query (in order of their first occurrence).
+
+    Parameter markers within string literals, quoted identifiers and comments are ignored.
+
+    Args:
+        sql: The query.
+        prefix: The parameter marker prefix (``@`` or ``:``).
+
+    """
+    names = [match['name'] for match in _TOKEN_PATTERN[prefix].finditer(sql) if match['name']]
+    return list(dict.fromkeys(names))
+
+
+def _bigquery_type(name: str, value: Any) -> str:
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return 'TIMESTAMP'
+    for types, bigquery_type in BIGQUERY_TYPES:
+        if isinstance(value, types):
+            return bigquery_type
+    raise ValueError(f'Query parameter "{name}" has an unsupported type ({type(value).__name__})')
+
+
+def _python_value(value: Any) -> Any:
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def bigquery_parameters(sql: str, namespace: Mapping[str, Any]) -> list[BigQueryParameter]:
+    """
+    Return the BigQuery parameters of the ``@name`` markers of a query.
+
+    Lists, tuples, sets, NumPy arrays and pandas series are converted to array parameters.
+
+    Args:
+        sql: The query.
+        namespace: The namespace containing the parameter values.
+
+    """
+    parameters: list[BigQueryParameter] = []
+    for name in find_parameters(sql, prefix='@'):
+        value = _parameter_value(name, namespace)
+        if isinstance(value, ARRAY_TYPES):
+            if not (values := [_python_value(item) for item in value]):
+                raise ValueError(f'Cannot determine the type of empty query parameter "{name}"')
+            array_type = _bigquery_type(name, values[0])
+            parameters.append(ArrayQueryParameter(name, array_type, values))
+        elif value is None:
+            raise ValueError(f'Cannot determine the type of query parameter "{name}" (None)')
+        else:
+            value = _python_value(value)
+            parameters.append(ScalarQueryParameter(name, _bigquery_type(name, value), value))
+    return parameters
+
+
+def redshift_parameters(sql: str, namespace: Mapping[str, Any]) -> tuple[str, list[Any]]:
+    """
+    Replace the ``:name`` markers of a query with positional placeholders.
+
+    Percent signs are escaped when the query has parameters, as required by the ``format``
+    parameter style of the Redshift driver.
+
+    Args:
+        sql: The query.
+        namespace: The namespace containing the parameter values.
+
+    Returns:
+        The query with positional placeholders and the list of parameter values.
+
+    """
+    if not find_parameters(sql, prefix=':'):
+        return sql, []
+    values = []
+
+    def replace(match: re.Match[str]) -> str:
+        if match['name']:
+            values.append(_python_value(_parameter_value(match['name'], namespace)))
+            return '%s'
+        return match[0].replace('%', '%%')
+
+    return _TOKEN_PATTERN[':'].sub(replace, sql), values
@@ -1,3 +1,14 @@
-from mindlab.plot import Figure, use_mindlab_styles
+from typing import TYPE_CHECKING, Any
 
-__all__ = ['Figure', 'use_mindlab_styles']
+if TYPE_CHECKING:
+    from mindlab.plot import Figure, save_all, use_mindlab_styles
+
+__all__ = ['Figure', 'save_all', 'use_mindlab_styles']
+
+
+def __getattr__(name: str) -> Any:
+    # Note: the plotting module is imported on first use as importing Matplotlib is slow
+    if name in __all__:
+        from mindlab import plot  # pylint: disable=import-outside-toplevel
+        return getattr(plot, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+DEFAULT_MAX_WORKERS = 4
+
+
+@dataclass
+class BackgroundQuery:
+    id: int
+    magic: str
+    sql: str
+    output: str | None
+    future: Future[Any] = field(repr=False)
+    started: float = field(default_factory=time.monotonic, repr=False)
+    finished: float | None = field(default=None, repr=False)
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return 'running'
+        if self.future.exception() is not None or self.future.result() is None:
+            return 'failed'
+        return 'finished'
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Return the number of seconds the query has been running for.
+        """
+        return (self.finished or time.monotonic()) - self.started
+
+    def result(self, timeout: float | None = None) -> Any:
+        """
+        Wait for the query to finish and return its result.
+        """
+        return self.future.result(timeout=timeout)
+
+    def __repr__(self) -> str:
+        output = f', output: {self.output}' if self.output else ''
+        return (
+            f'<Background query {self.id} ({self.magic}, {self.status} '
+            f'after {self.elapsed:,.1f} s{output})>'
+        )
+
+
+class BackgroundQueries:
+    def __init__(self, max_workers: int | None = None):
+        """
+        Run queries in a thread pool and keep track of them.
+
+        Args:
+            max_workers: The maximum number of queries that can run at the same time.
+                Defaults to 4.
+
+        """
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self._executor: ThreadPoolExecutor | None = None
+        self._queries: dict[int, BackgroundQuery] = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def submit(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        magic: str,
+        sql: str,
+        run: Callable[[], Any],
+        output: str | None = None,
+        on_success: Callable[[Any], Any] | None = None,
+    ) -> BackgroundQuery:
+        """
+        Submit a query for execution in the background.
+
+        Args:
+            magic: The name of the magic running the query.
+            sql: The query.
+            run: The function that runs the query and returns its result (or :data:`None` when the
+                query fails).
+            output: The name of the variable in which the result is stored.
+            on_success: The function to call with the result once the query has finished.
+
+        """
+        with self._lock:
+            if not self._executor:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='mindlab-query',
+                )
+            self._last_id += 1
+            future = self._executor.submit(run)
+            query = BackgroundQuery(
+                id=self._last_id, magic=magic, sql=sql, output=output, future=future,
+            )
+            self._queries[query.id] = query
+
+        def finish(future: Future[Any]) -> None:
+            query.finished = time.monotonic()
+            if on_success and not future.exception() and future.result() is not None:
+                on_success(future.result())
+
+        future.add_done_callback(finish)
+        return query
+
+    def queries(self) -> list[BackgroundQuery]:
+        with self._lock:
+            return list(self._queries.values())
+
+    def clear(self) -> None:
+        """
+        Remove the queries that are no longer running.
+        """
+        with self._lock:
+            for query_id, query in list(self._queries.items()):
+                if query.future.done():
+                    del self._queries[query_id]
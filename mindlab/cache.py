@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+from xdg_base_dirs import xdg_cache_home
+
+from mindlab.utils import LazyModule, parse_size
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow
+    from pyarrow import parquet
+else:
+    pd = LazyModule('pandas')
+    pyarrow = LazyModule('pyarrow')
+    parquet = LazyModule('pyarrow.parquet')
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_SIZE = '10 GB'
+DEFAULT_RENDER_CACHE_MAX_SIZE = '1 GB'
+
+
+class DiskCache:
+    def __init__(
+        self,
+        directory: Path,
+        suffix: str = '',
+        ttl: float | None = None,
+        max_size: int | str | None = None,
+    ):
+        """
+        Cache files with time-based expiry and size-bounded least recently used eviction.
+
+        Entries are stored as individual files, using the file modification time as the creation
+        time and the file access time as the last time the entry was used.
+
+        Args:
+            directory: The directory in which the cache entries are stored.
+            suffix: The file name suffix to use for the cache entries.
+            ttl: The number of seconds after which an entry expires (no expiry if not provided).
+            max_size: The maximum total size of the cache entries (no limit if not provided).
+
+        """
+        self.directory = Path(directory)
+        self.suffix = suffix
+        self.ttl = ttl
+        self.max_size = parse_size(max_size) if max_size is not None else None
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """
+        Return a cache key that uniquely identifies the given JSON-serializable parts.
+        """
+        serialized = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f'{key}{self.suffix}'
+
+    def get(self, key: str) -> Path | None:
+        """
+        Return the path of a valid cache entry and mark it as used.
+        """
+        path = self.path(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path, times=(time.time(), stat.st_mtime))
+        return path
+
+    def put(self, key: str, write: Callable[[Path], None]) -> Path:
+        """
+        Atomically create a cache entry using the given writer function and evict old entries.
+        """
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{uuid4().hex}.tmp')
+        try:
+            write(tmp_path)
+            tmp_path.replace(path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self.evict()
+        return path
+
+    def entries(self) -> list[tuple[Path, os.stat_result]]:
+        """
+        Return the current cache entries ordered from the least to the most recently used.
+        """
+        entries = []
+        for path in self.directory.glob(f'*{self.suffix}'):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:  # removed concurrently
+                continue
+        return sorted(entries, key=lambda entry: entry[1].st_atime)
+
+    def evict(self) -> None:
+        """
+        Remove expired entries and the least recently used entries exceeding the maximum size.
+        """
+        now = time.time()
+        entries = []
+        for path, stat in self.entries():
+            if self.ttl is not None and now - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((path, stat))
+
+        if self.max_size is None:
+            return
+        total_size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= stat.st_size
+
+    def clear(self) -> None:
+        for path, _ in self.entries():
+            path.unlink(missing_ok=True)
+
+
+class ResultCache(DiskCache):
+    def __init__(
+        self,
+        directory: Path | str | None = None,
+        ttl: float | None = None,
+        max_size: int | str | None = None,
+    ):
+        """
+        Cache query results as Parquet files.
+
+        Args:
+            directory: The cache directory. Defaults to ``$XDG_CACHE_HOME/mindlab/results``.
+            ttl: The number of seconds after which a result expires. Defaults to one day.
+            max_size: The maximum total size of the cached results. Defaults to 10 GB.
+
+        """
+        super().__init__(
+            directory=Path(directory) if directory else xdg_cache_home() / 'mindlab' / 'results',
+            suffix='.parquet',
+            ttl=ttl if ttl is not None else DEFAULT_TTL,
+            max_size=max_size if max_size is not None else DEFAULT_MAX_SIZE,
+        )
+
+    @staticmethod
+    def normalize_sql(sql: str) -> str:
+        """
+        Normalize a query by removing leading and trailing whitespace and empty lines.
+        """
+        return '\n'.join(line.strip() for line in sql.strip().splitlines() if line.strip())
+
+    def query_key(self, sql: str, **context: Any) -> str:
+        """
+        Return the cache key of a query executed in the given context.
+        """
+        return self.key(self.normalize_sql(sql), context)
+
+    def load(self, key: str, arrow: str | None = None) -> pd.DataFrame | pyarrow.Table | None:
+        """
+        Load a cached result.
+
+        Args:
+            key: The cache key of the result.
+            arrow: Whether to return a data frame with Arrow-backed types (``pandas``) or an Arrow
+                table (``table``) instead of a data frame with the default types.
+
+        """
+        if not (path := self.get(key)):
+            return None
+        if arrow == 'table':
+            return parquet.read_table(path)
+        if arrow == 'pandas':
+            return pd.read_parquet(path, dtype_backend='pyarrow')
+        return pd.read_parquet(path)
+
+    def store(self, key: str, data: pd.DataFrame | pyarrow.Table) -> None:
+        if isinstance(data, pyarrow.Table):
+            self.put(key, write=lambda path: parquet.write_table(data, path))
+        else:
+            self.put(key, write=data.to_parquet)
+
+
+class RenderCache(DiskCache):
+    def __init__(self, directory: Path | str | None = None, max_size: int | str | None = None):
+        """
+        Cache rendered figures as PNG files.
+
+        Entries never expire, as their keys are calculated from the content of the figures.
+
+        Args:
+            directory: The cache directory. Defaults to ``$XDG_CACHE_HOME/mindlab/figures``.
+            max_size: The maximum total size of the cached figures. Defaults to 1 GB.
+
+        """
+        super().__init__(
+            directory=Path(directory) if directory else xdg_cache_home() / 'mindlab' / 'figures',
+            suffix='.png',
+            max_size=max_size if max_size is not None else DEFAULT_RENDER_CACHE_MAX_SIZE,
+        )
+
+    def load(self, key: str) -> bytes | None:
+        return path.read_bytes() if (path := self.get(key)) else None
+
+    def store(self, key: str, data: bytes) -> None:
+        def write(path: Path) -> None:
+            path.write_bytes(data)
+
+        self.put(key, write=write)
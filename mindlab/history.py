@@ -0,0 +1,147 @@
+import hashlib
+import json
+import math
+import sqlite3
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from xdg_base_dirs import xdg_state_home
+
+from mindlab.cache import ResultCache
+
+
+@dataclass
+class HistoryEntry:  # pylint: disable=too-many-instance-attributes
+    started: datetime
+    magic: str
+    sql_hash: str
+    sql: str
+    phases: dict[str, float]
+    total_ms: float
+    rows: int | None
+    bytes_processed: int | None
+
+
+@dataclass
+class LatencySummary:
+    magic: str
+    count: int
+    p50_ms: float
+    p95_ms: float
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Return the percentile of the given values using the nearest-rank method.
+    """
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class QueryHistory:
+    def __init__(self, path: Path | str | None = None):
+        """
+        Record the executed queries in a local SQLite database.
+
+        Args:
+            path: The database path. Defaults to ``$XDG_STATE_HOME/mindlab/history.sqlite``.
+
+        """
+        self.path = Path(path) if path else xdg_state_home() / 'mindlab' / 'history.sqlite'
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.path, timeout=10)) as connection:
+            with connection:  # commit the changes
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS queries ('
+                    'started TEXT, magic TEXT, sql_hash TEXT, sql TEXT, phases TEXT, '
+                    'total_ms REAL, rows INTEGER, bytes_processed INTEGER)'
+                )
+                yield connection
+
+    def record(  # pylint: disable=too-many-arguments
+        self,
+        magic: str,
+        sql: str,
+        phases: dict[str, int],
+        *,
+        rows: int | None = None,
+        bytes_processed: int | None = None,
+    ) -> None:
+        """
+        Record an executed query.
+
+        Args:
+            magic: The name of the magic that ran the query.
+            sql: The query.
+            phases: The time spent in each phase of the query execution (in nanoseconds).
+            rows: The number of rows returned by the query.
+            bytes_processed: The amount of data processed by the query.
+
+        """
+        sql = ResultCache.normalize_sql(sql)
+        phases_ms = {name: time / 1e6 for name, time in phases.items()}
+        with self._connection() as connection:
+            connection.execute('INSERT INTO queries VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (
+                datetime.now(tz=timezone.utc).isoformat(),
+                magic,
+                hashlib.sha256(sql.encode()).hexdigest(),
+                sql,
+                json.dumps(phases_ms),
+                sum(phases_ms.values()),
+                rows,
+                bytes_processed,
+            ))
+
+    def entries(self, magic: str | None = None) -> list[HistoryEntry]:
+        """
+        Return the recorded queries, optionally only the ones run by the given magic.
+        """
+        with self._connection() as connection:
+            records = connection.execute(
+                'SELECT started, magic, sql_hash, sql, phases, total_ms, rows, bytes_processed '
+                'FROM queries WHERE ? IS NULL OR magic = ?',
+                (magic, magic),
+            ).fetchall()
+        return [
+            HistoryEntry(
+                started=datetime.fromisoformat(record[0]),
+                magic=record[1],
+                sql_hash=record[2],
+                sql=record[3],
+                phases=json.loads(record[4]),
+                total_ms=record[5],
+                rows=record[6],
+                bytes_processed=record[7],
+            )
+            for record in records
+        ]
+
+    def summary(self) -> list[LatencySummary]:
+        """
+        Return the median and 95th percentile query latencies per magic.
+        """
+        latencies: dict[str, list[float]] = {}
+        for entry in self.entries():
+            latencies.setdefault(entry.magic, []).append(entry.total_ms)
+        return [
+            LatencySummary(
+                magic=magic,
+                count=len(values),
+                p50_ms=percentile(values, 50),
+                p95_ms=percentile(values, 95),
+            )
+            for magic, values in sorted(latencies.items())
+        ]
+
+    def slowest(self, limit: int = 5, magic: str | None = None) -> list[HistoryEntry]:
+        return sorted(self.entries(magic), key=lambda entry: entry.total_ms, reverse=True)[:limit]
+
+    def clear(self) -> None:
+        with self._connection() as connection:
+            connection.execute('DELETE FROM queries')
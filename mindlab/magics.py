@@ -1,36 +1,143 @@
+# pylint: disable=too-many-lines
+from __future__ import annotations
+
+import importlib
+import re
+import sqlite3
 import sys
-from argparse import Namespace
-from functools import reduce
-from typing import Any, no_type_check
-
-import awswrangler
-import ipywidgets
-import pandas as pd
-import redshift_connector
-from boto3.session import Session
-from botocore import exceptions as aws_exceptions
-from google.auth.credentials import Credentials as GCPCredentials
-from google.cloud import bigquery, exceptions as gcp_exceptions
+import threading
+from argparse import BooleanOptionalAction, Namespace
+from collections import ChainMap, Counter
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, ExitStack, contextmanager
+from functools import cached_property, reduce
+from itertools import chain
+from textwrap import shorten
+from typing import TYPE_CHECKING, Any, TypeVar, cast, no_type_check
+from uuid import uuid4
+
 from humanize.filesize import naturalsize
 from IPython.core.magic import Magics, cell_magic, line_magic, magics_class
 from IPython.core.magic_arguments import argument, magic_arguments, parse_argstring
 from IPython.display import display
-from stormware.amazon.auth import AWSAuth
-from stormware.google.auth import GCPAuth
 
-from mindlab.utils import Timer, get_config, mindlab_config
+from mindlab.background import BackgroundQueries, BackgroundQuery
+from mindlab.cache import ResultCache
+from mindlab.history import QueryHistory
+from mindlab.pool import ConnectionPool
+from mindlab.utils import (
+    LazyModule, PhaseTimer, Timer, call_on_import,
+    compact_data_frame, get_config, mindlab_config, parse_size,
+)
+
+if TYPE_CHECKING:
+    import awswrangler
+    import db_dtypes
+    import ipywidgets
+    import pandas as pd
+    import pyarrow
+    import redshift_connector
+    from boto3.session import Session
+    from botocore import exceptions as aws_exceptions
+    from google.auth import exceptions as gcp_auth_exceptions
+    from google.auth.credentials import Credentials as GCPCredentials
+    from google.auth.transport import requests as gcp_requests
+    from google.cloud import bigquery, bigquery_storage, exceptions as gcp_exceptions
+    from google.cloud.bigquery import Client as BigQueryClient, QueryJob as BigQueryJob
+    from google.cloud.bigquery.table import RowIterator
+    from stormware.amazon import auth as aws_auth
+    from stormware.google import auth as gcp_auth
+
+    from mindlab import params
+    from mindlab.params import BigQueryParameter
+else:
+    # Note: these modules are imported on first use to keep the kernel startup time low
+    awswrangler = LazyModule('awswrangler')
+    db_dtypes = LazyModule('db_dtypes')
+    ipywidgets = LazyModule('ipywidgets')
+    pd = LazyModule('pandas')
+    pyarrow = LazyModule('pyarrow')
+    redshift_connector = LazyModule('redshift_connector')
+    aws_exceptions = LazyModule('botocore.exceptions')
+    gcp_auth_exceptions = LazyModule('google.auth.exceptions')
+    gcp_requests = LazyModule('google.auth.transport.requests')
+    bigquery = LazyModule('google.cloud.bigquery')
+    bigquery_storage = LazyModule('google.cloud.bigquery_storage')
+    gcp_exceptions = LazyModule('google.cloud.exceptions')
+    aws_auth = LazyModule('stormware.amazon.auth')
+    gcp_auth = LazyModule('stormware.google.auth')
+    params = LazyModule('mindlab.params')
+
+T = TypeVar('T')
+INCREMENTAL_PARAMETER = 'mindlab_incremental_max'
+# The nullable data types used by awswrangler for the Arrow data types inferred from query results
+REDSHIFT_DTYPES = {
+    **{
+        f'{sign}int{bits}': f'{sign.upper()}Int{bits}'
+        for sign in ['', 'u'] for bits in [8, 16, 32, 64]
+    },
+    'bool': 'boolean', 'string': 'string', 'large_string': 'string',
+}
 
 
 def compose_magic_decorators(*decorators: Any) -> Any:
     return reduce(lambda outer, inner: lambda magic_method: outer(inner(magic_method)), decorators)
 
 
+def bigquery_dtype(data_type: pyarrow.DataType, date_as_object: bool) -> Any:
+    """
+    Return the data type used by BigQuery for the given Arrow data type in data frames.
+    """
+    range_types = [
+        pyarrow.struct([('start', range_type), ('end', range_type)])
+        for range_type in [
+            pyarrow.date32(), pyarrow.timestamp('us'), pyarrow.timestamp('us', tz='UTC'),
+        ]
+    ]
+    if pyarrow.types.is_boolean(data_type):
+        return pd.BooleanDtype()
+    if pyarrow.types.is_integer(data_type):
+        return pd.Int64Dtype()
+    if pyarrow.types.is_date(data_type) and not date_as_object:
+        return db_dtypes.DateDtype()
+    if pyarrow.types.is_time(data_type):
+        return db_dtypes.TimeDtype()
+    if data_type in range_types:
+        return pd.ArrowDtype(data_type)
+    return None
+
+
 common_arguments = compose_magic_decorators(
     magic_arguments(),
     argument('output', nargs='?', help='Name of the variable in which to store the output'),
     argument('-o', '--organization', help='The organization to use'),
     argument('-t', '--transpose', action='store_true', help='Display the data frame transposed'),
     argument('-i', '--info', action='store_true', help='Display additional query information'),
+    argument(
+        '--cache', action=BooleanOptionalAction, default=None,
+        help='Whether to use the local result cache',
+    ),
+    argument('--refresh', action='store_true', help='Refresh the locally cached results'),
+    argument(
+        '--compact', action=BooleanOptionalAction, default=None,
+        help='Whether to convert the results to data types that use less memory',
+    ),
+    argument('-b', '--background', action='store_true', help='Run the query in the background'),
+    argument(
+        '--incremental', metavar='COLUMN',
+        help=(
+            'Only fetch the rows whose column value is not less than its maximum in the output '
+            'variable and append them to the existing data frame'
+        ),
+    ),
+    argument(
+        '--chunksize', type=int,
+        help=(
+            'Store an iterator of data frames with at most the given number of rows each in the '
+            'output variable'
+        ),
+    ),
 )
 common_gcp_arguments = compose_magic_decorators(
     common_arguments,
@@ -49,10 +156,43 @@ class MindLabMagics(Magics):
         Magics for data science work.
         """
         super().__init__(shell, **kwargs)
+        self._pandas_options_set = False
+        self._set_pandas_options()
+        if not self._pandas_options_set:
+            self.shell.events.register(  # type: ignore[union-attr]
+                'post_run_cell', self._set_pandas_options,
+            )
+        # Note: importing the plotting module applies the MindLab styles
+        call_on_import('matplotlib.pyplot', lambda: importlib.import_module('mindlab.plot'))
+        self._redshift_pool = self._create_redshift_pool()
+        self._bigquery_clients: dict[
+            tuple[str | None, str | None], tuple[BigQueryClient, GCPCredentials]
+        ] = {}
+        self._bigquery_read_clients: dict[
+            tuple[str | None, str | None], bigquery_storage.BigQueryReadClient
+        ] = {}
+        self._bigquery_clients_lock = threading.Lock()
+        self._background_queries = BackgroundQueries(
+            max_workers=self.get_config('background_workers', required=False, value_type=int),
+        )
+
+    @cached_property
+    def _aws_auth(self) -> aws_auth.AWSAuth:
+        return aws_auth.AWSAuth()
+
+    @cached_property
+    def _gcp_auth(self) -> gcp_auth.GCPAuth:
+        return gcp_auth.GCPAuth()
+
+    def _set_pandas_options(self, *_args: Any) -> None:
+        """
+        Set the pandas display options once pandas has been imported.
+        """
+        if self._pandas_options_set or 'pandas' not in sys.modules:
+            return
         pd.set_option('display.max_columns', 50)
         pd.set_option('display.max_rows', 500)
-        self._aws_auth = AWSAuth()
-        self._gcp_auth = GCPAuth()
+        self._pandas_options_set = True
 
     @no_type_check
     @magic_arguments()
@@ -76,52 +216,176 @@ class MindLabMagics(Magics):
 
     @no_type_check
     @common_gcp_arguments
+    @argument(
+        '-a', '--arrow', nargs='?', const='pandas', choices=['pandas', 'table'],
+        help=(
+            'Download the results as Arrow data via the BigQuery Storage Read API and return a '
+            'data frame with Arrow-backed types (pandas) or an Arrow table (table)'
+        ),
+    )
+    @argument('-s', '--streams', type=int, help='The maximum number of parallel read streams')
+    @argument(
+        '-d', '--dry-run', action='store_true',
+        help='Only estimate the amount of data processed by the query without running it',
+    )
+    @argument(
+        '-m', '--max-bytes-billed',
+        help='The maximum amount of data the query may process (e.g. 500 GB)',
+    )
     @cell_magic
-    def bigquery(self, line: str, cell: str) -> pd.DataFrame | None:
+    def bigquery(
+        self, line: str, cell: str,
+    ) -> pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame] | BackgroundQuery | None:
         """
         Run a Google BigQuery query.
-        """
-        args = parse_argstring(self.bigquery, line)
-        client_args = self._gcp_client_arguments(args, magic='bigquery')
-        with bigquery.Client(**client_args) as client:
-            query = client.query(cell)
-            try:
-                with Timer() as timer:
-                    progress_bar = 'tqdm_notebook' if args.info else None
-                    data = query.to_dataframe(progress_bar_type=progress_bar)
-            except gcp_exceptions.BadRequest as error:
-                print(f'Error: {error}', file=sys.stderr)
-                return None
 
-        if args.info:
-            processed = (
-                naturalsize(query.total_bytes_processed)
-                if not query.cache_hit else 'none (returned from cache)'
-            )
-            self._display_query_details(
-                total_time_ms=timer.time / 1e6,
-                details=[f'Data processed: <b>{processed}</b>'],
-            )
+        Query parameters (like ``@name``) are bound to the notebook variables with the same name,
+        which keeps the query text stable and allows BigQuery to reuse cached results. Lists and
+        other sequences are bound as array parameters (e.g. for ``WHERE id IN UNNEST(@ids)``).
 
-        return self._cell_magic_data(data=data, args=args)
+        The maximum number of parallel read streams used in Arrow mode can also be set via the
+        ``bigquery_streams`` configuration value (by default it is determined by the server).
+
+        Queries that would be billed for more data than allowed by the ``--max-bytes-billed``
+        argument or the ``bigquery_max_bytes_billed`` configuration value are refused by BigQuery
+        without being billed.
+        """
+        args = parse_argstring(self.bigquery, line)
+        return self._execute(args, magic='bigquery', sql=cell, run=self._run_bigquery)
 
     @no_type_check
     @common_aws_arguments
     @argument('-c', '--connection', help='The Glue connection to use')
+    @argument(
+        '-u', '--unload', action=BooleanOptionalAction, default=None,
+        help='Whether to extract the results via UNLOAD (instead of using the leader node)',
+    )
     @cell_magic
-    def redshift(self, line: str, cell: str) -> pd.DataFrame | None:
+    def redshift(
+        self, line: str, cell: str,
+    ) -> pd.DataFrame | Iterator[pd.DataFrame] | BackgroundQuery | None:
         """
         Run an Amazon Redshift query.
+
+        Query parameters (like ``:name``) are bound to the notebook variables with the same name.
+        Note that queries with parameters cannot be run in UNLOAD mode.
+
+        In UNLOAD mode the results are unloaded as Parquet files into a temporary location under
+        the S3 path set via the ``redshift_unload_path`` configuration value, which are then read
+        in parallel and deleted afterwards. The IAM role to use for unloading can be set via the
+        ``redshift_unload_iam_role`` configuration value. When the ``redshift_unload_threshold``
+        configuration value is set, UNLOAD mode is used automatically for queries that are
+        estimated to return at least the given number of rows.
         """
         args = parse_argstring(self.redshift, line)
-        session = self._aws_session(args, magic='redshift')
+        return self._execute(args, magic='redshift', sql=cell, run=self._run_redshift)
+
+    @no_type_check
+    def _run_bigquery(
+        self, args: Namespace, cell: str,
+    ) -> pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame] | None:
+        if args.chunksize and args.arrow:
+            print(
+                'Error: the --chunksize and --arrow arguments cannot be combined', file=sys.stderr,
+            )
+            return None
+        parameters = self._query_parameters(cell, args=args, bind=params.bigquery_parameters)
+        if parameters is None:
+            return None
+        timer = PhaseTimer()
+        with timer.phase('auth'):
+            client = self._bigquery_client(args)
+        cache_key = self._cache_key(
+            args, magic='bigquery', sql=cell, project=client.project,
+            organization=self.get_config(
+                'organization', args.organization, magic='bigquery', required=False,
+            ),
+            parameters=[parameter.to_api_repr() for parameter in parameters],
+        )
+        max_bytes_billed = self._max_bytes_billed(args)
+        if args.dry_run:
+            self._bigquery_dry_run(
+                client, sql=cell, parameters=parameters, max_bytes_billed=max_bytes_billed,
+            )
+            return None
+
+        query = None
+        data = self._load_cached_data(
+            cache_key, args=args, magic='bigquery', timer=timer, arrow=args.arrow,
+        )
+        if data is None:
+            try:
+                with timer.phase('execution'):
+                    query = client.query(cell, job_config=bigquery.QueryJobConfig(
+                        query_parameters=parameters, maximum_bytes_billed=max_bytes_billed,
+                    ))
+                    rows = query.result(page_size=args.chunksize)
+                data = self._bigquery_data(query, rows, args=args, timer=timer)
+            except gcp_exceptions.BadRequest as error:
+                print(f'Error: {error}', file=sys.stderr)
+                return None
+            self._store_cached_data(cache_key, data, magic='bigquery', timer=timer)
+            self._record_query(
+                magic='bigquery', sql=cell, timer=timer, data=data,
+                bytes_processed=query.total_bytes_processed,
+            )
+
+        data, compact_details = self._compact_data(data, args=args, magic='bigquery', timer=timer)
+        if args.info:
+            self._display_bigquery_details(
+                query, args=args, cache_key=cache_key, timer=timer, details=compact_details,
+            )
+        return data
+
+    @no_type_check
+    def _run_redshift(  # pylint: disable=too-many-locals
+        self, args: Namespace, cell: str,
+    ) -> pd.DataFrame | Iterator[pd.DataFrame] | None:
+        if not (bound := self._redshift_parameters(args, sql=cell)):
+            return None
+        sql, parameters = bound
+        timer = PhaseTimer()
+        with timer.phase('auth'):
+            session = self._aws_session(args, magic='redshift')
+        connection_name = self.get_config('redshift_connection', args.connection)
+        organization = self.get_config(
+            'organization', args.organization, magic='redshift', required=False,
+        )
+        cache_key = self._cache_key(
+            args, magic='redshift', sql=cell, connection=connection_name,
+            organization=organization, region=session.region_name, parameters=parameters,
+        )
         try:
-            with Timer() as timer:
-                connection = awswrangler.redshift.connect(
-                    connection=self.get_config('redshift_connection', args.connection),
-                    boto3_session=session, timeout=10,
-                )
-                data = awswrangler.redshift.read_sql_query(sql=cell, con=connection)
+            unload = False
+            data = self._load_cached_data(cache_key, args=args, magic='redshift', timer=timer)
+            hit = data is not None
+            if not hit and args.chunksize:
+                with timer.phase('execution + first chunk'):
+                    data = self._prefetch(self._redshift_chunks(
+                        args=args, sql=sql, parameters=parameters, session=session,
+                        pooled_connection=self._redshift_connection(
+                            connection_name, organization=organization, session=session,
+                        ),
+                    ))
+            elif not hit:
+                with ExitStack() as stack:
+                    with timer.phase('connection'):
+                        connection = stack.enter_context(self._redshift_connection(
+                            connection_name, organization=organization, session=session,
+                        ))
+                    unload = self._use_unload(
+                        args, sql=sql, parameters=parameters, connection=connection, timer=timer,
+                    )
+                    data = (
+                        self._redshift_unload(
+                            sql=sql, connection=connection, session=session, timer=timer,
+                        )
+                        if unload
+                        else self._redshift_query(
+                            sql=sql, parameters=parameters, connection=connection, timer=timer,
+                        )
+                    )
+                self._store_cached_data(cache_key, data, magic='redshift', timer=timer)
         except aws_exceptions.UnauthorizedSSOTokenError as error:
             print(f'Profile: {session.profile_name}', file=sys.stderr)
             print(f'Error: {error}', file=sys.stderr)
@@ -133,18 +397,511 @@ class MindLabMagics(Magics):
             print(f'Error: {error}', file=sys.stderr)
             return None
 
+        if not hit:
+            self._record_query(magic='redshift', sql=cell, timer=timer, data=data)
+        data, compact_details = self._compact_data(data, args=args, magic='redshift', timer=timer)
+        if args.info:
+            self._display_query_details(
+                total_time_ms=timer.time / 1e6,
+                timing_info=timer.summary(),
+                details=[
+                    *(
+                        [] if hit or args.chunksize
+                        else [f'Extraction: <b>{"UNLOAD" if unload else "cursor"}</b>']
+                    ),
+                    *self._chunk_details(args),
+                    *self._cache_details(cache_key, hit=hit, args=args),
+                    *compact_details,
+                ],
+            )
+
+        return data
+
+    @no_type_check
+    @magic_arguments()
+    @argument('-i', '--info', action='store_true', help='Display additional query information')
+    @cell_magic
+    def multiquery(self, line: str, cell: str) -> None:
+        """
+        Run multiple Google BigQuery and Amazon Redshift queries concurrently.
+
+        Each query must be preceded by a header comment line specifying the magic to use for the
+        query followed by its arguments (which must include the name of the output variable), for
+        example:
+
+        .. code-block:: sql
+
+            -- bigquery users --project my-project
+            SELECT * FROM users
+            -- redshift orders --connection my-connection
+            SELECT * FROM orders
+
+        The results of the queries that succeed are stored in their output variables, and the
+        errors of the queries that fail are reported separately.
+        """
+        args = parse_argstring(self.multiquery, line)
+        try:
+            queries = self._parse_multiquery(cell)
+        except ValueError as error:
+            print(f'Error: {error}', file=sys.stderr)
+            return
+
+        def run(query: tuple[str, Namespace, str]) -> tuple[Any, int]:
+            magic, query_args, sql = query
+            with Timer() as timer:
+                try:
+                    data = getattr(self, f'_run_{magic}')(query_args, sql)
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    # Note: unexpected errors must not discard the results of the other queries
+                    print(
+                        f'Error: the {magic} query "{query_args.output}" failed ({error})',
+                        file=sys.stderr,
+                    )
+                    data = None
+            return data, timer.time
+
+        with Timer() as timer, ThreadPoolExecutor(
+            max_workers=len(queries), thread_name_prefix='mindlab-multiquery',
+        ) as executor:
+            results = list(executor.map(run, queries))
+
+        for (_, query_args, _), (data, _) in zip(queries, results):
+            if data is not None:
+                self._cell_magic_data(data=data, args=query_args)
         if args.info:
-            self._display_query_details(total_time_ms=timer.time / 1e6)
+            self._display_query_details(
+                total_time_ms=timer.time / 1e6,
+                timing_info=f'sum of queries: {sum(time for _, time in results) / 1e6:,.0f} ms',
+                details=[
+                    f'{query_args.output} ({magic}): <b>'
+                    f'{"failed" if data is None else f"{time / 1e6:,.0f} ms"}</b>'
+                    for (magic, query_args, _), (data, time) in zip(queries, results)
+                ],
+            )
 
-        return self._cell_magic_data(data=data, args=args)
+    @no_type_check
+    @magic_arguments()
+    @argument(
+        'action', nargs='?', choices=['status', 'reset'], default='status',
+        help='Whether to show the pool status or to close all pooled connections',
+    )
+    @line_magic
+    def redshift_pool(self, line: str) -> None:
+        """
+        Manage the pooled Amazon Redshift connections.
+
+        Connections are reused across queries that use the same Glue connection, organization and
+        region. The maximum number of open connections and the number of seconds after which
+        unused connections are closed can be set via the ``redshift_pool_size`` and
+        ``redshift_pool_idle_timeout`` configuration values (defaulting to 4 and 600,
+        respectively).
+        """
+        args = parse_argstring(self.redshift_pool, line)
+        if args.action == 'reset':
+            self._redshift_pool.reset()
+            self._redshift_pool = self._create_redshift_pool()
+            print('All pooled connections have been closed')
+            return
+
+        status = self._redshift_pool.status()
+        open_connections = sum(item.idle + item.in_use for item in status)
+        print(
+            f'Open connections: {open_connections} '
+            f'(limit: {self._redshift_pool.max_connections}, '
+            f'idle timeout: {self._redshift_pool.idle_timeout:,.0f} s)'
+        )
+        for item in status:
+            connection, organization, region = item.key
+            print(
+                f'- {connection} (organization: {organization or "default"}, '
+                f'region: {region or "default"}): {item.idle} idle, {item.in_use} in use'
+            )
+
+    @no_type_check
+    @magic_arguments()
+    @argument('--clear', action='store_true', help='Remove the queries that are no longer running')
+    @line_magic
+    def queries(self, line: str) -> None:
+        """
+        List the queries that have been started in the background.
+
+        Queries can be started in the background by using the ``--background`` argument, in which
+        case a handle to the query is returned immediately and its results are stored in the
+        output variable once the query has finished. Note that query details are not displayed for
+        background queries. The maximum number of queries that can run at the same time can be
+        set via the ``background_workers`` configuration value (defaulting to 4).
+        """
+        args = parse_argstring(self.queries, line)
+        if args.clear:
+            self._background_queries.clear()
+            return
+        for query in self._background_queries.queries():
+            sql = shorten(query.sql, width=60, placeholder='...')
+            output = f' -> {query.output}' if query.output else ''
+            print(
+                f'{query.id}: {query.magic}{output} ({query.status}, {query.elapsed:,.1f} s): '
+                f'{sql}'
+            )
+
+    @no_type_check
+    @magic_arguments()
+    @argument('-m', '--magic', help='Only show the queries run by the given magic')
+    @argument(
+        '-n', '--slowest', type=int, default=5, help='The number of slowest queries to show',
+    )
+    @argument('--clear', action='store_true', help='Remove all queries from the history')
+    @line_magic
+    def query_history(self, line: str) -> None:
+        """
+        Summarize the latencies of the recorded queries and list the slowest ones.
+
+        The time spent in each phase of the execution (like authentication, query execution and
+        download), the number of returned rows and the amount of processed data is recorded for
+        every query that is not returned from the local cache. The history location can be set via
+        the ``history_path`` configuration value (defaulting to
+        ``$XDG_STATE_HOME/mindlab/history.sqlite``) and recording can be disabled by setting the
+        ``history`` configuration value to false.
+        """
+        args = parse_argstring(self.query_history, line)
+        history = self._query_history()
+        if args.clear:
+            history.clear()
+            print('The query history has been cleared')
+            return
+        if not (summary := [
+            item for item in history.summary() if not args.magic or item.magic == args.magic
+        ]):
+            print('No queries have been recorded')
+            return
+        for item in summary:
+            print(
+                f'{item.magic}: {item.count:,} queries, p50: {item.p50_ms:,.0f} ms, '
+                f'p95: {item.p95_ms:,.0f} ms'
+            )
+        print('Slowest queries:')
+        for entry in history.slowest(limit=args.slowest, magic=args.magic):
+            phases = ', '.join(f'{name}: {time:,.0f} ms' for name, time in entry.phases.items())
+            print(
+                f'- {entry.total_ms:,.0f} ms ({entry.magic}, '
+                f'{entry.started.astimezone():%Y-%m-%d %H:%M}; {phases}): '
+                f'{shorten(entry.sql, width=60, placeholder="...")}'
+            )
 
     @staticmethod
     def get_config(
-        name: str, value: str | None = None, magic: str | None = None, required: bool = True,
-    ) -> str | None:
-        if not value and magic:
-            value = get_config(f'{magic}_{name}')
-        return value or get_config(name, required=required)
+        name: str,
+        value: Any | None = None,
+        magic: str | None = None,
+        required: bool = True,
+        value_type: Any | None = None,
+    ) -> Any:
+        if value is None and magic:
+            value = get_config(f'{magic}_{name}', value_type=value_type)
+        return get_config(name, value, value_type=value_type, required=required)
+
+    @no_type_check
+    def _parse_multiquery(self, cell: str) -> list[tuple[str, Namespace, str]]:
+        """
+        Split a multi-query cell into the magic, the parsed arguments and the SQL of each query.
+        """
+        queries = []
+        for block in re.split(r'^(?=--\s*(?:bigquery|redshift)\b)', cell, flags=re.MULTILINE):
+            if not block.strip():
+                continue
+            header, _, sql = block.partition('\n')
+            if not (match := re.match(r'--\s*(bigquery|redshift)\b(.*)', header)):
+                raise ValueError(
+                    'Each query must be preceded by a "-- bigquery" or "-- redshift" line'
+                )
+            magic, line = match.groups()
+            query_args = parse_argstring(getattr(self, magic), line)
+            if not query_args.output:
+                raise ValueError(f'The output variable of the {magic} query is missing')
+            if not sql.strip():
+                raise ValueError(f'The {magic} query "{query_args.output}" is empty')
+            if query_args.incremental:
+                raise ValueError('Incremental queries are not supported in multi-query cells')
+            if query_args.background:
+                raise ValueError('Background queries are not supported in multi-query cells')
+            query_args.info = False  # the details are displayed for all queries together
+            queries.append((magic, query_args, sql))
+        if not queries:
+            raise ValueError('No queries have been provided')
+        return queries
+
+    def _create_redshift_pool(self) -> ConnectionPool:
+        return ConnectionPool(
+            max_connections=self.get_config(
+                'pool_size', magic='redshift', required=False, value_type=int,
+            ),
+            idle_timeout=self.get_config(
+                'pool_idle_timeout', magic='redshift', required=False, value_type=float,
+            ),
+        )
+
+    def _use_unload(  # pylint: disable=too-many-arguments
+        self, args: Namespace, *, sql: str, parameters: list[Any], connection: Any,
+        timer: PhaseTimer,
+    ) -> bool:
+        if args.unload is not None:
+            return bool(args.unload)
+        threshold: int | None = self.get_config(
+            'redshift_unload_threshold', required=False, value_type=int,
+        )
+        if threshold is None or parameters:  # UNLOAD does not support query parameters
+            return False
+        with timer.phase('estimate'):
+            rows = self._estimate_rows(sql=sql, connection=connection)
+        return (rows or 0) >= threshold
+
+    @staticmethod
+    def _estimate_rows(sql: str, connection: Any) -> int | None:
+        """
+        Return the number of rows returned by a query as estimated by the query planner.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = cursor.fetchall()
+        if plan and (match := re.search(r'\brows=(\d+)', str(plan[0][0]))):
+            return int(match.group(1))
+        return None
+
+    @contextmanager
+    def _redshift_unload_path(self, session: Session) -> Iterator[str]:
+        path = self.get_config('redshift_unload_path').rstrip('/')
+        path = f'{path}/mindlab-unload-{uuid4().hex}/'
+        try:
+            yield path
+        finally:  # the files are only deleted by awswrangler when all data has been read
+            awswrangler.s3.delete_objects(path=path, boto3_session=session)
+
+    def _redshift_unload(
+        self, sql: str, connection: Any, session: Session, timer: PhaseTimer,
+    ) -> pd.DataFrame:
+        with self._redshift_unload_path(session) as path:
+            with timer.phase('execution'):
+                awswrangler.redshift.unload_to_files(
+                    sql=sql, path=path, con=connection, boto3_session=session,
+                    iam_role=self.get_config('redshift_unload_iam_role', required=False),
+                )
+            # Note: awswrangler converts each Parquet file right after downloading it
+            with timer.phase('download + conversion'):
+                return awswrangler.s3.read_parquet(path=path, boto3_session=session)
+
+    def _redshift_query(
+        self, sql: str, parameters: list[Any], connection: Any, timer: PhaseTimer,
+    ) -> pd.DataFrame:
+        # Note: the driver receives all rows while the query is executed
+        with timer.phase('execution + download'), connection.cursor() as cursor:
+            cursor.execute(sql, parameters or None)
+            rows = cursor.fetchall()
+            columns = [
+                name.decode() if isinstance(name, bytes) else name
+                for name, *_ in cursor.description
+            ]
+        with timer.phase('conversion'):
+            return self._redshift_data_frame(rows, columns=columns)
+
+    @staticmethod
+    def _redshift_data_frame(rows: list[tuple[Any, ...]], columns: list[str]) -> pd.DataFrame:
+        """
+        Convert the rows returned by a Redshift cursor to a data frame.
+
+        The data types are the same as the ones returned by awswrangler's ``read_sql_query``, which
+        cannot be used as it fetches and converts the rows in a single call.
+        """
+        if not rows:
+            return pd.DataFrame(columns=columns)
+        arrays = []
+        for values in zip(*rows):
+            try:
+                arrays.append(pyarrow.array(values))
+            except pyarrow.ArrowInvalid:  # e.g. UUID values
+                arrays.append(pyarrow.array(
+                    [None if value is None else str(value) for value in values],
+                    type=pyarrow.string(),
+                ))
+        return cast(pd.DataFrame, pyarrow.Table.from_arrays(arrays, names=columns).to_pandas(
+            date_as_object=True,
+            types_mapper=lambda data_type: (
+                pd.api.types.pandas_dtype(dtype)
+                if (dtype := REDSHIFT_DTYPES.get(str(data_type))) else None
+            ),
+        ))
+
+    def _redshift_connection(
+        self, connection_name: str, organization: str | None, session: Session,
+    ) -> AbstractContextManager[Any]:
+        return self._redshift_pool.connection(
+            key=(connection_name, organization, session.region_name),
+            connect=lambda: awswrangler.redshift.connect(
+                connection=connection_name, boto3_session=session, timeout=10,
+            ),
+        )
+
+    def _redshift_chunks(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        args: Namespace,
+        sql: str,
+        parameters: list[Any],
+        pooled_connection: AbstractContextManager[Any],
+        session: Session,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yield the results in chunks, keeping the connection until all chunks have been read.
+        """
+        with pooled_connection as connection:
+            if not self._use_unload(  # the whole setup is timed when prefetching the first chunk
+                args, sql=sql, parameters=parameters, connection=connection, timer=PhaseTimer(),
+            ):
+                yield from awswrangler.redshift.read_sql_query(
+                    sql=sql, con=connection, params=parameters or None, chunksize=args.chunksize,
+                )
+                return
+            with self._redshift_unload_path(session) as path:
+                yield from awswrangler.redshift.unload(
+                    sql=sql, path=path, con=connection, boto3_session=session,
+                    iam_role=self.get_config('redshift_unload_iam_role', required=False),
+                    chunked=args.chunksize,
+                )
+
+    def _query_parameters(
+        self, sql: str, args: Namespace, bind: Callable[[str, Any], T],
+    ) -> T | None:
+        """
+        Bind the query parameters to the values of the notebook variables with the same name.
+        """
+        namespace = ChainMap(
+            getattr(args, 'parameters', {}), self.shell.user_ns,  # type: ignore[union-attr]
+        )
+        try:
+            return bind(sql, namespace)
+        except ValueError as error:
+            print(f'Error: {error}', file=sys.stderr)
+            return None
+
+    def _redshift_parameters(self, args: Namespace, sql: str) -> tuple[str, list[Any]] | None:
+        if (bound := self._query_parameters(sql, args=args, bind=params.redshift_parameters)) and (
+            bound[1] and args.unload
+        ):
+            print('Error: query parameters cannot be used in UNLOAD mode', file=sys.stderr)
+            return None
+        return bound
+
+    def _result_cache(self, magic: str) -> ResultCache:
+        return ResultCache(
+            directory=self.get_config('cache_dir', magic=magic, required=False),
+            ttl=self.get_config('cache_ttl', magic=magic, required=False, value_type=float),
+            max_size=self.get_config('cache_max_size', magic=magic, required=False),
+        )
+
+    def _cache_key(self, args: Namespace, magic: str, sql: str, **context: Any) -> str | None:
+        use_cache = self.get_config(
+            'cache', args.cache, magic=magic, required=False, value_type=bool,
+        )
+        if args.chunksize or not (use_cache or (args.refresh and use_cache is None)):
+            return None
+        return self._result_cache(magic).query_key(sql, magic=magic, **context)
+
+    def _load_cached_data(  # pylint: disable=too-many-arguments
+        self,
+        cache_key: str | None,
+        *,
+        args: Namespace,
+        magic: str,
+        timer: PhaseTimer,
+        arrow: str | None = None,
+    ) -> pd.DataFrame | pyarrow.Table | None:
+        if not cache_key or args.refresh:
+            return None
+        with timer.phase('local cache'):
+            return self._result_cache(magic).load(cache_key, arrow=arrow)
+
+    def _store_cached_data(
+        self,
+        cache_key: str | None,
+        data: pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame],
+        magic: str,
+        timer: PhaseTimer,
+    ) -> None:
+        if not cache_key:
+            return
+        with timer.phase('local cache'):
+            try:
+                self._result_cache(magic).store(cache_key, cast(pd.DataFrame, data))
+            except (ValueError, TypeError, NotImplementedError, OSError) as error:
+                print(f'Warning: could not cache the results ({error})', file=sys.stderr)
+
+    def _query_history(self) -> QueryHistory:
+        return QueryHistory(path=self.get_config('history_path', required=False))
+
+    def _record_query(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        magic: str,
+        sql: str,
+        timer: PhaseTimer,
+        data: pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame],
+        bytes_processed: int | None = None,
+    ) -> None:
+        if self.get_config('history', magic=magic, required=False, value_type=bool) is False:
+            return
+        try:
+            self._query_history().record(
+                magic, sql, timer.phases,
+                rows=None if isinstance(data, Iterator) else len(data),
+                bytes_processed=bytes_processed,
+            )
+        except sqlite3.Error as error:
+            print(f'Warning: could not record the query in the history ({error})', file=sys.stderr)
+
+    def _compact_data(
+        self,
+        data: pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame],
+        args: Namespace,
+        magic: str,
+        timer: PhaseTimer,
+    ) -> tuple[pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame], list[str]]:
+        """
+        Convert the results to data types that use less memory when compaction is enabled.
+        """
+        compact = self.get_config(
+            'compact', args.compact, magic=magic, required=False, value_type=bool,
+        )
+        if not compact or isinstance(data, pyarrow.Table):
+            return data, []
+        if isinstance(data, Iterator):
+            return (compact_data_frame(chunk) for chunk in data), []
+        with timer.phase('compaction'):
+            memory_usage = data.memory_usage(deep=True).sum()
+            data = compact_data_frame(data)
+            compact_memory_usage = data.memory_usage(deep=True).sum()
+        return data, [
+            f'Memory usage: <b>{naturalsize(compact_memory_usage)} '
+            f'(compacted from {naturalsize(memory_usage)})</b>'
+        ]
+
+    @staticmethod
+    def _prefetch(chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """
+        Read the first chunk immediately so that query errors are raised when running the query.
+        """
+        first_chunk = next(chunks, None)
+        return chain([] if first_chunk is None else [first_chunk], chunks)
+
+    @staticmethod
+    def _chunk_details(args: Namespace) -> list[str]:
+        if not args.chunksize:
+            return []
+        return [f'Result format: <b>iterator (chunks of up to {args.chunksize:,} rows)</b>']
+
+    @staticmethod
+    def _cache_details(cache_key: str | None, hit: bool, args: Namespace) -> list[str]:
+        if not cache_key:
+            return []
+        status = 'hit' if hit else ('refreshed' if args.refresh else 'miss')
+        return [f'Local cache: <b>{status}</b>']
 
     def _gcp_client_arguments(
         self, args: Namespace, magic: str,
@@ -160,6 +917,181 @@ class MindLabMagics(Magics):
             'project': self._gcp_auth.project_id(**auth_args),
         }
 
+    def _bigquery_client_key(self, args: Namespace) -> tuple[str | None, str | None]:
+        return (
+            self.get_config('organization', args.organization, magic='bigquery', required=False),
+            self.get_config('project', args.project, magic='bigquery', required=False),
+        )
+
+    def _bigquery_client(self, args: Namespace) -> BigQueryClient:
+        """
+        Return a cached client, creating a new one when its credentials can no longer be refreshed.
+        """
+        key = self._bigquery_client_key(args)
+        with self._bigquery_clients_lock:
+            if cached := self._bigquery_clients.get(key):
+                client, credentials = cached
+                if self._refresh_credentials(credentials):
+                    return client
+                client.close()  # type: ignore[no-untyped-call]
+                self._bigquery_read_clients.pop(key, None)
+            client_args = self._gcp_client_arguments(args, magic='bigquery')
+            client = bigquery.Client(**client_args)  # type: ignore[arg-type]
+            credentials = cast('GCPCredentials', client_args['credentials'])
+            self._bigquery_clients[key] = (client, credentials)
+            return client
+
+    def _bigquery_read_client(self, args: Namespace) -> bigquery_storage.BigQueryReadClient:
+        key = self._bigquery_client_key(args)
+        with self._bigquery_clients_lock:
+            if not (read_client := self._bigquery_read_clients.get(key)):
+                _, credentials = self._bigquery_clients[key]
+                read_client = bigquery_storage.BigQueryReadClient(  # type: ignore[no-untyped-call]
+                    credentials=credentials,
+                )
+                self._bigquery_read_clients[key] = read_client
+            return read_client
+
+    def _display_bigquery_details(  # pylint: disable=too-many-arguments
+        self,
+        query: BigQueryJob | None,
+        *,
+        args: Namespace,
+        cache_key: str | None,
+        timer: PhaseTimer,
+        details: list[str],
+    ) -> None:
+        if not query:
+            processed = 'none (returned from local cache)'
+        elif query.cache_hit:
+            processed = 'none (returned from cache)'
+        else:
+            processed = naturalsize(query.total_bytes_processed)
+        self._display_query_details(
+            total_time_ms=timer.time / 1e6,
+            timing_info=timer.summary(),
+            details=[
+                f'Data processed: <b>{processed}</b>',
+                *([f'Result format: <b>Arrow ({args.arrow})</b>'] if args.arrow else []),
+                *self._chunk_details(args),
+                *self._cache_details(cache_key, hit=not query, args=args),
+                *details,
+            ],
+        )
+
+    def _bigquery_data(
+        self, query: BigQueryJob, rows: RowIterator, args: Namespace, timer: PhaseTimer,
+    ) -> pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame]:
+        if args.chunksize:
+            with timer.phase('first chunk'):
+                # Note: the return type of to_dataframe_iterable() is annotated incorrectly
+                chunks = cast(Iterator[pd.DataFrame], rows.to_dataframe_iterable())
+                return self._prefetch(iter(chunks))
+        if args.arrow:
+            return self._bigquery_arrow_data(query, rows, args=args, timer=timer)
+        with timer.phase('download'):
+            progress_bar = 'tqdm_notebook' if args.info else None
+            table = rows.to_arrow(progress_bar_type=progress_bar)
+        with timer.phase('conversion'):
+            return self._bigquery_data_frame(table)
+
+    @staticmethod
+    def _bigquery_data_frame(table: pyarrow.Table) -> pd.DataFrame:
+        """
+        Convert downloaded BigQuery results to a data frame.
+
+        The data types are the same as the ones returned by ``RowIterator.to_dataframe()``, which
+        cannot be used as it downloads and converts the results in a single call.
+        """
+        def out_of_bounds(is_type: Callable[[pyarrow.DataType], bool]) -> bool:
+            try:
+                for column in table.columns:
+                    if is_type(column.type):
+                        column.cast(pyarrow.timestamp('ns'))
+            except pyarrow.ArrowInvalid:
+                return True
+            return False
+
+        date_as_object = out_of_bounds(pyarrow.types.is_date)
+        return cast(pd.DataFrame, table.to_pandas(
+            date_as_object=date_as_object,
+            timestamp_as_object=out_of_bounds(pyarrow.types.is_timestamp),
+            integer_object_nulls=True,
+            types_mapper=lambda data_type: bigquery_dtype(
+                data_type, date_as_object=date_as_object,
+            ),
+        ))
+
+    def _bigquery_arrow_data(
+        self, query: BigQueryJob, rows: RowIterator, args: Namespace, timer: PhaseTimer,
+    ) -> pd.DataFrame | pyarrow.Table:
+        with timer.phase('download'):
+            batches = list(rows.to_arrow_iterable(
+                bqstorage_client=self._bigquery_read_client(args),
+                max_stream_count=self.get_config(
+                    'streams', args.streams, magic='bigquery', required=False, value_type=int,
+                ),
+            ))
+            # Note: the schema of empty results is only available via the REST API
+            table = (
+                pyarrow.Table.from_batches(batches) if batches
+                else query.to_arrow(create_bqstorage_client=False)
+            )
+        if args.arrow == 'table':
+            return table
+        with timer.phase('conversion'):
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    @staticmethod
+    def _bigquery_estimate(
+        client: BigQueryClient,
+        sql: str,
+        parameters: list[BigQueryParameter],
+    ) -> BigQueryJob:
+        """
+        Run a query in dry run mode, which estimates the amount of data processed by the query.
+        """
+        return client.query(sql, job_config=bigquery.QueryJobConfig(
+            dry_run=True, query_parameters=parameters,
+        ))
+
+    def _max_bytes_billed(self, args: Namespace) -> int | None:
+        max_bytes_billed = self.get_config(
+            'max_bytes_billed', args.max_bytes_billed, magic='bigquery', required=False,
+        )
+        return parse_size(max_bytes_billed) if max_bytes_billed else None
+
+    def _bigquery_dry_run(
+        self,
+        client: BigQueryClient,
+        sql: str,
+        parameters: list[BigQueryParameter],
+        max_bytes_billed: int | None,
+    ) -> None:
+        try:
+            query = self._bigquery_estimate(client, sql=sql, parameters=parameters)
+        except gcp_exceptions.BadRequest as error:
+            print(f'Error: {error}', file=sys.stderr)
+            return
+        processed = query.total_bytes_processed or 0
+        print(f'Estimated data processed: {naturalsize(processed)}')
+        if max_bytes_billed:
+            status = 'exceeded' if processed > max_bytes_billed else 'within limit'
+            print(f'Maximum bytes billed: {naturalsize(max_bytes_billed)} ({status})')
+        print('Referenced tables:')
+        for table in query.referenced_tables:
+            print(f'- {table}')
+
+    @staticmethod
+    def _refresh_credentials(credentials: GCPCredentials) -> bool:
+        if not credentials.expired:
+            return True
+        try:
+            credentials.refresh(gcp_requests.Request())  # type: ignore[no-untyped-call]
+        except gcp_auth_exceptions.RefreshError:
+            return False
+        return True
+
     def _aws_session(self, args: Namespace, magic: str) -> Session:
         org = self.get_config('organization', args.organization, magic=magic, required=False)
         return self._aws_auth.session(
@@ -180,12 +1112,125 @@ class MindLabMagics(Magics):
             f'Total time: <b>{total_time_ms:,.0f} ms{timing_info}</b>',
         ])))
 
-    def _cell_magic_data(self, data: pd.DataFrame, args: Namespace) -> pd.DataFrame | None:
+    def _execute(
+        self, args: Namespace, magic: str, sql: str,
+        run: Callable[
+            [Namespace, str], pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame] | None
+        ],
+    ) -> pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame] | BackgroundQuery | None:
+        if args.chunksize and not args.output:
+            # Cell results are kept in the output history, which would keep the iterator alive
+            print('Error: the output variable must be specified in chunk mode', file=sys.stderr)
+            return None
+        existing = None
+        if args.incremental:
+            if not (incremental := self._incremental_query(args, magic=magic, sql=sql)):
+                return None
+            sql, existing = incremental
+
+        def execute() -> pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame] | None:
+            data = run(args, sql)
+            if existing is None or not isinstance(data, pd.DataFrame):
+                return data
+            return self._merge_incremental(existing, data, column=args.incremental)
+
+        if args.background:
+            args.info = False  # query details cannot be displayed for background queries
+            return self._background_queries.submit(
+                magic=magic, sql=sql, run=execute, output=args.output,
+                on_success=lambda data: self._cell_magic_data(data=data, args=args),
+            )
+        if (data := execute()) is None:
+            return None
+        return self._cell_magic_data(data=data, args=args)
+
+    def _incremental_query(
+        self, args: Namespace, magic: str, sql: str,
+    ) -> tuple[str, pd.DataFrame | None] | None:
+        """
+        Return the query restricted to the rows that are not older than the existing rows.
+
+        The existing data frame is also returned (or :data:`None` when all rows must be fetched).
+        """
+        column = args.incremental
+        error = None
+        if not args.output:
+            error = 'the output variable must be specified in incremental mode'
+        elif args.chunksize or getattr(args, 'arrow', None) == 'table':
+            error = 'incremental mode only supports data frame results'
+        elif not re.fullmatch(r'[A-Za-z_]\w*', column):
+            error = f'invalid incremental column "{column}"'
+        if error:
+            print(f'Error: {error}', file=sys.stderr)
+            return None
+        existing = self.shell.user_ns.get(args.output)  # type: ignore[union-attr]
+        if not isinstance(existing, pd.DataFrame) or existing.empty:
+            return sql, None
+        if column not in existing:
+            print(f'Error: column "{column}" not found in "{args.output}"', file=sys.stderr)
+            return None
+        if pd.isna(max_value := existing[column].max()):
+            return sql, None
+        quote, marker = ('`', '@') if magic == 'bigquery' else ('"', ':')
+        args.parameters = {INCREMENTAL_PARAMETER: max_value}
+        sql = sql.strip().rstrip(';')
+        # Note: the column name is validated and the maximum value is bound as a query parameter
+        return (
+            f'SELECT * FROM (\n{sql}\n) AS incremental '  # nosec B608
+            f'WHERE {quote}{column}{quote} >= {marker}{INCREMENTAL_PARAMETER}',
+            existing,
+        )
+
+    @staticmethod
+    def _merge_incremental(
+        existing: pd.DataFrame, data: pd.DataFrame, column: str,
+    ) -> pd.DataFrame:
+        """
+        Append the fetched rows to the existing rows, dropping the rows that were fetched again.
+
+        Only the fetched rows with the previous maximum column value can be present already, and
+        each of them matches at most one such existing row, so other duplicate rows are kept.
+        """
+        def key(value: Any) -> Any:  # array and struct values are not hashable
+            if isinstance(value, dict):
+                return tuple((name, key(item)) for name, item in value.items())
+            if pd.api.types.is_list_like(value):
+                return tuple(key(item) for item in value)
+            return None if pd.isna(value) else value
+
+        def row_keys(rows: pd.DataFrame) -> Iterator[tuple[Any, ...]]:
+            return (
+                tuple(key(value) for value in row)
+                for row in rows.itertuples(index=False, name=None)
+            )
+
+        max_value = existing[column].max()
+        overlap = data[column].isin([max_value]).to_list()
+        counts = Counter(row_keys(existing[existing[column].isin([max_value])]))
+        keep = [True] * len(data)
+        for position, row_key in zip(
+            (position for position, is_overlap in enumerate(overlap) if is_overlap),
+            row_keys(data[overlap]),
+        ):
+            if counts[row_key]:
+                counts[row_key] -= 1
+                keep[position] = False
+        return pd.concat([existing, data[keep]], ignore_index=True)
+
+    def _cell_magic_data(
+        self, data: pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame], args: Namespace,
+    ) -> pd.DataFrame | pyarrow.Table | Iterator[pd.DataFrame] | None:
+        self._set_pandas_options()
         if args.output:
             self.shell.push({args.output: data})  # type: ignore[union-attr]
             return None
-        return data if not args.transpose else data.transpose()
+        if not args.transpose or isinstance(data, Iterator):
+            return data
+        if isinstance(data, pyarrow.Table):
+            data = data.to_pandas(types_mapper=pd.ArrowDtype)
+        return data.transpose()
 
 
 def load_ipython_extension(ipython: Any) -> None:
+    importlib.import_module('db_dtypes')  # registers the BigQuery date and time pandas data types
     ipython.register_magics(MindLabMagics)
@@ -1,21 +1,202 @@
+# pylint: disable=too-many-lines
 import filecmp
+import hashlib
+import json
+import multiprocessing
+import pickle  # nosec: only used for hashing figures
 import shutil
-from collections.abc import Iterable
+import time
+import warnings
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass
 from io import BytesIO
+from itertools import repeat
 from os import PathLike
 from pathlib import Path
-from typing import IO, Any
+from typing import IO, Any, cast
 
 import matplotlib
-from matplotlib import artist, colormaps, colors, dates, pyplot, ticker
-from matplotlib.collections import PathCollection
+import matplotlib.figure
+import numpy as np
+from matplotlib import artist, colormaps, colors, dates, patheffects, pyplot, ticker
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.collections import Collection, LineCollection, PathCollection
+from matplotlib.layout_engine import PlaceHolderLayoutEngine
 from matplotlib.legend_handler import HandlerPathCollection
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch, PathPatch
+from matplotlib.path import Path as MatplotlibPath
+from matplotlib.style.core import STYLE_BLACKLIST  # type: ignore[attr-defined]
+from matplotlib.transforms import Transform, TransformNode
 from pandas import DataFrame, Series
 from pandas.core.groupby.generic import DataFrameGroupBy
 from xdg_base_dirs import xdg_data_home
 
+from mindlab.cache import RenderCache
 from mindlab.utils import get_config
 
+FONTS_DIR = Path(__file__).parent / 'fonts'
+BAR_PATH_THRESHOLD = 1000
+GROUP_BATCH_THRESHOLD = 100
+LEGEND_GROUPS = 10
+DECIMATION_THRESHOLD = 10_000
+KDE_BINNED_THRESHOLD = 10_000
+KDE_GRID_SIZE = (2**10, 2**22)
+RUG_THRESHOLD = 10_000
+AGGREGATE_THRESHOLD = 1_000_000
+AGGREGATE_REDUCERS = ('count', 'sum', 'mean')
+AGGREGATE_IMAGE_OPTIONS = ('alpha', 'norm', 'vmin', 'vmax')
+AGGREGATE_LEGEND_OPTIONS = ('label', 'marker', 's')
+FONT_MANIFEST = '.mindlab-fonts.json'
+RASTERIZE_THRESHOLD = 10_000
+VECTOR_FORMATS = {'eps', 'pdf', 'ps', 'svg', 'svgz'}
+
+# Attributes that do not affect rendering and differ between otherwise identical figures
+DIGEST_IGNORED_ATTRIBUTES: dict[type, str] = {
+    TransformNode: '_parents',  # keyed by object identifiers
+    matplotlib.figure.Figure: '_number',  # the pyplot figure number
+    dates.rrulewrapper: '_rrule',  # contains the creation time (reconstructed when drawing)
+}
+
+
+@dataclass
+class SaveInfo:
+    format: str
+    size: int | None  # in bytes, unless unknown
+    seconds: float
+    rasterized: int  # the number of rasterized artists
+
+
+class MindLabFigure(matplotlib.figure.Figure):
+    def __init__(self, *args: Any, **kwargs: Any):
+        """
+        Create a Matplotlib figure that runs hooks before each render and counts the renders.
+
+        Layout passes (in which nothing is rendered) are not counted. The hooks run after a layout
+        pass, when the ticks are known, and the layout is updated if they changed the figure.
+        Matplotlib runs a layout pass before saving figures that have a layout engine (including
+        when they are displayed in IPython), so saving them renders the figure once.
+
+        Attributes:
+            pre_draw_hooks (list): The functions to call before each render, which return whether
+                they changed the figure.
+            rasterized_artists (list): The artists to rasterize when rendering (but not during
+                layout passes, in which Matplotlib would still rasterize them).
+            draw_count (int): The number of times the figure was rendered.
+            layout_pass (bool): Whether the figure is being drawn for its layout only.
+
+        """
+        super().__init__(*args, **kwargs)
+        self.pre_draw_hooks: list[Callable[[], bool]] = []
+        self.rasterized_artists: list[artist.Artist] = []
+        self.draw_count = 0
+        self.layout_pass = False
+
+    def draw(self, renderer: Any) -> None:
+        layout_pass = self.layout_pass or self._is_saving_layout_pass()
+        for rasterized_artist in self.rasterized_artists:
+            rasterized_artist.set_rasterized(not layout_pass)
+        if layout_pass:
+            super().draw(renderer)
+            if self._run_pre_draw_hooks():  # update the layout
+                super().draw(renderer)
+            return
+        self._run_pre_draw_hooks()
+        self.draw_count += 1
+        super().draw(renderer)
+
+    def draw_without_rendering(self) -> None:
+        self.layout_pass = True
+        try:
+            super().draw_without_rendering()
+        finally:
+            self.layout_pass = False
+
+    def _is_saving_layout_pass(self) -> bool:
+        # Note: Matplotlib replaces the layout engine with a placeholder after its layout pass
+        layout_engine = self.get_layout_engine()
+        return (
+            self.canvas.is_saving() and layout_engine is not None
+            and not isinstance(layout_engine, PlaceHolderLayoutEngine)
+        )
+
+    def _run_pre_draw_hooks(self) -> bool:
+        changed = False
+        for hook in self.pre_draw_hooks:
+            changed = hook() or changed
+        return changed
+
+
+class DigestPickler(pickle.Pickler):
+    """
+    Pickle figures deterministically (for calculating content hashes only).
+    """
+    def reducer_override(self, obj: Any) -> Any:  # pylint: disable=no-self-use
+        for cls, attribute in DIGEST_IGNORED_ATTRIBUTES.items():
+            if isinstance(obj, cls):
+                state = cast(dict[str, Any], obj.__getstate__())
+                state = {name: value for name, value in state.items() if name != attribute}
+                return object.__new__, (type(obj),), state
+        return NotImplemented
+
+
+class LineDecimation(patheffects.AbstractPathEffect):
+    """
+    Draw only the first, last, minimum and maximum points of each pixel column of a line.
+
+    The columns are computed from the transformed path at draw time, so they follow the axes
+    limits, the figure size and the resolution of the output (vector outputs use the resolution of
+    their raster images).
+    """
+    def draw_path(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, renderer: Any, gc: Any, tpath: MatplotlibPath, affine: Transform,
+        rgbFace: Any = None,
+    ) -> None:
+        if tpath.codes is None and len(tpath) > DECIMATION_THRESHOLD:
+            vertices = np.asarray(tpath.vertices)
+            pixels = affine.transform(vertices) * renderer.get_image_magnification()
+            indices = self.decimated_indices(pixels[:, 0], pixels[:, 1])
+            if len(indices) < len(vertices):
+                tpath = MatplotlibPath(vertices[indices])
+        renderer.draw_path(gc, tpath, affine, rgbFace)
+
+    @staticmethod
+    def decimated_indices(
+        x: np.ndarray[Any, Any], y: np.ndarray[Any, Any],
+    ) -> np.ndarray[Any, Any]:
+        """
+        Return the indices of the first, last, minimum and maximum points of each pixel column.
+
+        Consecutive points in the same column form a bucket, so points without coordinates (gaps)
+        are always kept.
+        """
+        columns = np.floor(x)
+        starts = np.flatnonzero(np.concatenate([[True], columns[1:] != columns[:-1]]))
+        if 4 * len(starts) >= len(x):
+            return np.arange(len(x))
+        lasts = np.append(starts[1:], len(x)) - 1
+        indices = np.concatenate([
+            starts, lasts,
+            LineDecimation.first_extrema(y, starts, lasts, np.fmin),
+            LineDecimation.first_extrema(y, starts, lasts, np.fmax),
+        ])
+        return np.unique(indices[indices < len(x)])
+
+    @staticmethod
+    def first_extrema(
+        y: np.ndarray[Any, Any], starts: np.ndarray[Any, Any], lasts: np.ndarray[Any, Any],
+        extremum: np.ufunc,
+    ) -> np.ndarray[Any, Any]:
+        """
+        Return the index of the first extremum of each bucket (or the length of y if none).
+        """
+        with np.errstate(invalid='ignore'), suppress(RuntimeWarning):
+            extrema = np.repeat(extremum.reduceat(y, starts), lasts - starts + 1)
+        positions = np.where(y == extrema, np.arange(len(y)), len(y))
+        return np.minimum.reduceat(positions, starts)
+
 
 def copy_folder(source_dir: Path, target_dir: Path) -> list[Path]:
     """
@@ -31,6 +212,38 @@ def copy_folder(source_dir: Path, target_dir: Path) -> list[Path]:
     return target_files
 
 
+def folder_stamp(directory: Path) -> str:
+    """
+    Return a hash of the names, sizes and modification times of the files in a directory.
+    """
+    files = [
+        (path.name, (stat := path.stat()).st_size, stat.st_mtime_ns)
+        for path in sorted(directory.glob('*'))
+    ]
+    return hashlib.sha256(json.dumps(files).encode()).hexdigest()
+
+
+def install_fonts(target_dir: Path) -> list[Path]:
+    """
+    Install the style fonts and return the paths of the installed files.
+
+    The installed files are only compared to the bundled files when the install manifest shows
+    that the bundled files have changed or that some of the installed files are missing.
+    """
+    manifest_path = target_dir / FONT_MANIFEST
+    stamp = folder_stamp(FONTS_DIR)
+    with suppress(OSError, ValueError, TypeError, KeyError):
+        manifest = json.loads(manifest_path.read_text())
+        font_files = [target_dir / name for name in manifest['files']]
+        if manifest['stamp'] == stamp and all(font_file.exists() for font_file in font_files):
+            return font_files
+
+    font_files = copy_folder(source_dir=FONTS_DIR, target_dir=target_dir)
+    manifest = {'stamp': stamp, 'files': [font_file.name for font_file in font_files]}
+    manifest_path.write_text(json.dumps(manifest))
+    return font_files
+
+
 def use_mindlab_styles(
     font_install_path: Path | None = None,
     apply_mindlab_styles: bool = True,
@@ -55,11 +268,8 @@ def use_mindlab_styles(
     if not get_config('apply_mindlab_styles', apply_mindlab_styles):
         return False
 
-    # Installing fonts and styles
-    font_files = copy_folder(
-        source_dir=Path(__file__).parent / 'fonts',
-        target_dir=font_install_path or xdg_data_home() / 'fonts',
-    )
+    # Installing fonts
+    font_files = install_fonts(target_dir=font_install_path or xdg_data_home() / 'fonts')
 
     # Refreshing font cache if necessary
     font_manager = matplotlib.font_manager.fontManager
@@ -126,7 +336,8 @@ class Figure:
         """
         xtics = xtics or ('log' if xscale else 'eng')
         ytics = ytics or ('log' if yscale else 'eng')
-        self.figure, self.axes = pyplot.subplots(figsize=size)
+        figure, self.axes = pyplot.subplots(figsize=size, FigureClass=MindLabFigure)
+        self.figure = cast(MindLabFigure, figure)
         if title:
             self.axes.set_title(title)
         if xlabel:
@@ -147,26 +358,120 @@ class Figure:
             self.axes.set_ylim(*ylim)
         if legend:
             self._legend_location = legend.replace('top', 'upper').replace('bottom', 'lower')
-            self.figure.canvas.mpl_connect('draw_event', self._add_legend)
+            self._legend_entries: tuple[list[Any], list[Any]] | None = None
+            self.figure.pre_draw_hooks.append(self._update_legend)
 
     def __getattr__(self, name: str) -> Any:
+        if 'axes' not in self.__dict__:  # e.g. while unpickling
+            raise AttributeError(name)
         return getattr(self.axes, name)  # default to the axes interface
 
-    def as_bytes(self) -> bytes:
+    @property
+    def draw_count(self) -> int:
+        """
+        Return the number of times the figure was rendered.
+        """
+        return self.figure.draw_count
+
+    def as_bytes(self, cache: bool | None = None) -> bytes:
+        """
+        Return the figure rendered in PNG format.
+
+        Args:
+            cache: Whether to serve identical figures from the render cache (keyed on a hash of
+                the plotted data, the figure configuration and the active style). Defaults to the
+                ``render_cache`` configuration value (disabled by default). The cache location
+                and its maximum total size can be set via the ``render_cache_dir`` and
+                ``render_cache_max_size`` configuration values.
+
+        """
+        if not get_config('render_cache', cache, value_type=bool):
+            return self._render()
+        render_cache = RenderCache(
+            directory=get_config('render_cache_dir'),
+            max_size=get_config('render_cache_max_size'),
+        )
+        try:
+            key = render_cache.key(
+                self._digest(), dict(matplotlib.rcParams), matplotlib.__version__,
+            )
+        except (pickle.PicklingError, TypeError, AttributeError):  # e.g. lambda tick formatters
+            return self._render()
+        if (data := render_cache.load(key)) is None:
+            data = self._render()
+            render_cache.store(key, data)
+        return data
+
+    def _render(self) -> bytes:
         output = BytesIO()
         self.save(output, format='png')
         return output.getvalue()
 
-    def save(self, output: str | PathLike[Any] | IO[Any], **kwargs: Any) -> None:
+    def _digest(self) -> str:
+        output = BytesIO()
+        DigestPickler(output, protocol=pickle.HIGHEST_PROTOCOL).dump(self.figure)
+        return hashlib.sha256(output.getbuffer()).hexdigest()
+
+    def save(
+        self,
+        output: str | PathLike[Any] | IO[Any],
+        rasterize_threshold: int | None = None,
+        **kwargs: Any,
+    ) -> SaveInfo:
         """
         Save the figure.
 
+        Lines, collections and patches with many elements are rasterized in vector formats, while
+        text, axes and legends are kept as vectors.
+
         Args:
             output: A path or object to use for saving.
+            rasterize_threshold: The number of elements (e.g. points or vertices) above which
+                artists are rasterized in vector formats. Defaults to the ``rasterize_threshold``
+                configuration value (10,000 by default). Use 0 to disable rasterization.
             **kwargs: Arguments to forward to :meth:`matplotlib.figure.Figure.savefig`.
 
+        Returns:
+            The format, the file size and the duration of the save.
+
         """
-        self.figure.savefig(output, **kwargs)
+        started = time.perf_counter()
+        file_format = _file_format(output, kwargs.get('format'))
+        threshold: int | None = get_config(
+            'rasterize_threshold', rasterize_threshold, value_type=int,
+        )
+        heavy_artists: list[artist.Artist] = []
+        if file_format in VECTOR_FORMATS:
+            heavy_artists = self._heavy_artists(
+                RASTERIZE_THRESHOLD if threshold is None else threshold,
+            )
+        position = _tell(output)
+        self.figure.rasterized_artists = heavy_artists
+        try:
+            self.figure.savefig(output, **kwargs)
+        finally:
+            self.figure.rasterized_artists = []
+            for heavy_artist in heavy_artists:
+                heavy_artist.set_rasterized(False)
+        return SaveInfo(
+            format=file_format,
+            size=_written_size(output, position),
+            seconds=time.perf_counter() - started,
+            rasterized=len(heavy_artists),
+        )
+
+    def _heavy_artists(self, threshold: int) -> list[artist.Artist]:
+        if threshold <= 0:
+            return []
+        artists: list[Line2D | Collection | Patch] = [
+            *self.axes.lines, *self.axes.collections, *self.axes.patches,
+        ]
+        columns = self._pixel_columns()
+        return [
+            heavy_artist for heavy_artist in artists
+            if not heavy_artist.get_rasterized()
+            and _element_count(heavy_artist, columns=columns) > threshold
+        ]
 
     def line(self, *args: Any, **kwargs: Any) -> None:
         """
@@ -175,31 +480,80 @@ class Figure:
         Args:
             *args: Arguments to forward to :meth:`matplotlib.axes.Axes.plot`.
                 If the first argument is a grouped data frame (see :doc:`GroupBy
-                <pandas:reference/groupby>`) we draw a line for each group.
+                <pandas:reference/groupby>`) we draw a line for each group. When there are more
+                than 100 groups, all lines are drawn as a single collection without markers and
+                only the 10 largest groups are shown in the legend.
             **kwargs: Arguments to forward to :meth:`matplotlib.axes.Axes.plot`.
 
+        Lines without markers that have more than 10,000 points are decimated when they are
+        drawn: we only draw the first, last, minimum and maximum points of each pixel column
+        (see :class:`LineDecimation`), which looks the same as drawing every point. The data of
+        the lines is not changed.
+
         """
         if args and isinstance(args[0], DataFrameGroupBy):
+            if args[0].ngroups > GROUP_BATCH_THRESHOLD:
+                self._batched_lines(args[0], **kwargs)
+                return
             for group in args[0].groups:
                 group_data = args[0].get_group(group)
                 self.line(group_data[group_data.columns[0]], label=group, **kwargs)
         else:
             kwargs.setdefault('marker', '')
-            self.axes.plot(*args, **kwargs)
+            for line in self.axes.plot(*args, **kwargs):
+                self._decimate(line)
 
-    def scatter(self, *args: Any, **kwargs: Any) -> None:
+    @staticmethod
+    def _decimate(line: Line2D) -> None:
+        if (
+            np.size(line.get_xdata()) > DECIMATION_THRESHOLD and not line.get_path_effects()
+            and line.get_marker() in {'', 'None', ' ', None}
+        ):
+            line.set_path_effects([LineDecimation()])
+
+    def _pixel_columns(self) -> int:
+        """
+        Return the width of the axes in pixels at the resolution of saved figures.
+        """
+        dpi = pyplot.rcParams['savefig.dpi']
+        dpi = self.figure.dpi if dpi == 'figure' else max(dpi, self.figure.dpi)
+        return int(self.axes.get_position().width * self.figure.get_figwidth() * dpi)
+
+    def scatter(self, *args: Any, aggregate: str | None = None, **kwargs: Any) -> None:
         """
         Draw a scatter plot.
 
         Args:
             *args: Arguments to forward to :meth:`matplotlib.axes.Axes.scatter`.
                 If the first argument is a grouped data frame (see :doc:`GroupBy
-                <pandas:reference/groupby>`) we draw a scatter plot for each group.
+                <pandas:reference/groupby>`) we draw a scatter plot for each group. When there
+                are more than 100 groups, all points are drawn as a single collection and only
+                the 10 largest groups are shown in the legend.
+            aggregate: Draw the points as a single image with a cell for each pixel of the axes
+                instead of drawing each point. The value of a cell is the number of points in it
+                (``count``) or the ``sum`` or ``mean`` of their color values (``c``). Defaults to
+                ``count`` (or ``mean`` with color values) for more than a million ungrouped
+                points in linear scales. The ``label``, ``marker`` and ``s`` arguments are only
+                used for the legend entry of the points, and the arguments that cannot be applied
+                to the image are ignored with a warning.
             **kwargs: Arguments to forward to :meth:`matplotlib.axes.Axes.scatter`.
 
         """
         color_values = kwargs.pop('c', None)
         cmap = kwargs.pop('cmap', None)
+        grouped = bool(args) and isinstance(args[0], DataFrameGroupBy)
+
+        # Aggregate points
+        if aggregate is None and not grouped:
+            aggregate = self._default_aggregate(args, {**kwargs, 'c': color_values})
+        if aggregate:
+            if grouped:
+                raise ValueError('Grouped scatter plots cannot be aggregated')
+            image = self._aggregated_scatter(
+                *args, c=color_values, cmap=cmap, reducer=aggregate, **kwargs,
+            )
+            self._add_colorbar(image)
+            return
 
         # Apply colors to facecolor
         if color_values is not None and not isinstance(color_values, str):
@@ -207,34 +561,194 @@ class Figure:
             kwargs['facecolor'] = pyplot.get_cmap(cmap)(normalize(color_values))
 
         # Draw plot
-        if args and isinstance(args[0], DataFrameGroupBy):
-            groups: dict[Any, Any] = args[0].groups
-            if cmap:
-                normalized = colors.Normalize(min(groups.keys()), max(groups.keys()))
-            for group in groups:
-                if cmap:
-                    kwargs['color'] = colormaps[cmap](normalized(group))
-                group_data = args[0].get_group(group)
-                self.axes.scatter(
-                    x=group_data[group_data.columns[0]],
-                    y=group_data[group_data.columns[1]],
-                    label=group, **kwargs,
-                )
+        if grouped and args[0].ngroups > GROUP_BATCH_THRESHOLD:
+            self._batched_scatter(args[0], cmap=cmap, **kwargs)
+        elif grouped:
+            self._grouped_scatter(args[0], cmap=cmap, **kwargs)
         else:
             self.axes.scatter(*args, **kwargs)
 
         # Draw colorbar
         if color_values is not None:
-            with pyplot.rc_context({'axes.grid': False}):
-                mappable = matplotlib.cm.ScalarMappable(norm=normalize, cmap=cmap)
-                mappable.set_array(color_values)
-                colorbar = self.figure.colorbar(mappable=mappable, ax=self.axes)
-                colorbar.ax.minorticks_off()
+            mappable = matplotlib.cm.ScalarMappable(norm=normalize, cmap=cmap)
+            mappable.set_array(color_values)
+            self._add_colorbar(mappable)
+
+    def _grouped_scatter(
+        self, data: DataFrameGroupBy, cmap: str | None, **kwargs: Any,  # type: ignore[type-arg]
+    ) -> None:
+        groups: dict[Any, Any] = data.groups
+        if cmap:
+            normalized = colors.Normalize(min(groups.keys()), max(groups.keys()))
+        for group in groups:
+            if cmap:
+                kwargs['color'] = colormaps[cmap](normalized(group))
+            group_data = data.get_group(group)
+            self.axes.scatter(
+                x=group_data[group_data.columns[0]],
+                y=group_data[group_data.columns[1]],
+                label=group, **kwargs,
+            )
+
+    def _add_colorbar(self, mappable: matplotlib.cm.ScalarMappable) -> None:
+        with pyplot.rc_context({'axes.grid': False}):
+            colorbar = self.figure.colorbar(mappable=mappable, ax=self.axes)
+            colorbar.ax.minorticks_off()
+
+    def _linear_scales(self) -> bool:
+        return self.axes.get_xscale() == 'linear' and self.axes.get_yscale() == 'linear'
+
+    def _default_aggregate(self, args: tuple[Any, ...], kwargs: dict[str, Any]) -> str | None:
+        x = kwargs.get('x', args[0] if args else None)
+        if x is None or np.size(x) <= AGGREGATE_THRESHOLD or not self._linear_scales():
+            return None
+        color_values = kwargs.get('c')
+        return 'count' if color_values is None or isinstance(color_values, str) else 'mean'
+
+    def _aggregated_scatter(  # pylint: disable=too-many-arguments
+        self, x: Any = None, y: Any = None, *, c: Any, cmap: str | None, reducer: str,
+        **kwargs: Any,
+    ) -> matplotlib.image.AxesImage:
+        """
+        Draw the points as an image of the given reducer over the pixel grid of the axes.
+        """
+        if reducer not in AGGREGATE_REDUCERS:
+            raise ValueError(f'Invalid aggregate "{reducer}" (use one of {AGGREGATE_REDUCERS})')
+        if reducer != 'count' and (c is None or isinstance(c, str)):
+            raise ValueError(f'Aggregate "{reducer}" requires color values')
+        if not self._linear_scales():
+            raise ValueError('Aggregated scatter plots require linear scales')
+        x, y = kwargs.pop('x', x), kwargs.pop('y', y)
+        self.axes.xaxis.update_units(x)
+        self.axes.yaxis.update_units(y)
+        x = np.ravel(np.asarray(self.axes.convert_xunits(x), dtype=float))
+        y = np.ravel(np.asarray(self.axes.convert_yunits(y), dtype=float))
+        weights = None if reducer == 'count' else np.ravel(np.asarray(c, dtype=float))
+        values, counts, extent = self._pixel_histogram(x, y, weights=weights, reducer=reducer)
+        options = {name: kwargs.pop(name) for name in AGGREGATE_IMAGE_OPTIONS if name in kwargs}
+        image = self.axes.imshow(
+            np.ma.masked_where(counts < 1, values).T, extent=extent,
+            origin='lower', aspect='auto', interpolation='nearest', cmap=cmap, **options,
+        )
+        if 'label' in kwargs:  # represent the points in the legend
+            marker_options = {
+                name: kwargs.pop(name) for name in AGGREGATE_LEGEND_OPTIONS if name in kwargs
+            }
+            self.axes.scatter([], [], color=image.get_cmap()(1.0), **marker_options)
+        if kwargs:
+            warnings.warn(
+                f'Aggregated scatter plots ignore the arguments {", ".join(sorted(kwargs))}',
+                stacklevel=3,
+            )
+        return image
+
+    def _pixel_histogram(
+        self, x: np.ndarray[Any, Any], y: np.ndarray[Any, Any],
+        weights: np.ndarray[Any, Any] | None, reducer: str,
+    ) -> tuple[np.ndarray[Any, Any], np.ndarray[Any, Any], tuple[float, float, float, float]]:
+        """
+        Return the reduced values, the number of points and the extent of the pixel grid.
+        """
+        valid = np.isfinite(x) & np.isfinite(y)
+        if weights is not None:
+            valid &= np.isfinite(weights)
+            weights = weights[valid]
+        x, y = x[valid], y[valid]
+
+        width, height = self.axes.get_window_extent().size
+        histogram_range = None
+        if not (self.axes.get_autoscalex_on() or self.axes.get_autoscaley_on()):
+            histogram_range = [self.axes.get_xlim(), self.axes.get_ylim()]
+        counts, x_edges, y_edges = np.histogram2d(
+            x, y, bins=[max(int(width), 1), max(int(height), 1)], range=histogram_range,
+        )
+        values = counts
+        if weights is not None:
+            values = np.histogram2d(x, y, bins=[x_edges, y_edges], weights=weights)[0]
+            if reducer == 'mean':
+                values = np.divide(values, counts, out=np.zeros_like(values), where=counts > 0)
+        return values, counts, (x_edges[0], x_edges[-1], y_edges[0], y_edges[-1])
+
+    @staticmethod
+    def _group_codes(
+        data: DataFrameGroupBy,  # type: ignore[type-arg]
+    ) -> tuple[np.ndarray[Any, Any], list[Any], np.ndarray[Any, Any]]:
+        """
+        Return the group number of each row (-1 for dropped rows), the group labels and sizes.
+        """
+        sizes = data.size()
+        codes = data.ngroup().fillna(-1).to_numpy(dtype=int)
+        return codes, list(sizes.index), sizes.to_numpy()
+
+    @staticmethod
+    def _add_legend_proxies(
+        plot: Callable[..., Any], labels: list[Any], sizes: np.ndarray[Any, Any],
+        group_colors: list[Any],
+    ) -> None:
+        """
+        Add empty artists that represent the largest groups in the legend.
+        """
+        for index in np.argsort(-sizes, kind='stable')[:LEGEND_GROUPS]:
+            plot([], [], color=group_colors[index], label=labels[index])
+
+    def _batched_lines(  # pylint: disable=protected-access
+        self, data: DataFrameGroupBy, **kwargs: Any,  # type: ignore[type-arg]
+    ) -> None:
+        codes, labels, sizes = self._group_codes(data)
+        self.axes.xaxis.update_units(data.obj.index)
+        x = np.asarray(self.axes.convert_xunits(data.obj.index), dtype=float)
+        y = data.obj[data.obj.columns[0]].to_numpy(dtype=float)
+        order = np.flatnonzero(codes >= 0)
+        order = order[np.argsort(codes[order], kind='stable')]
+        segments = np.split(np.column_stack([x[order], y[order]]), np.cumsum(sizes)[:-1])
+
+        if 'color' not in kwargs and 'colors' not in kwargs:
+            next_color = self.axes._get_lines.get_next_color  # type: ignore[attr-defined]
+            kwargs['colors'] = [next_color() for _ in labels]
+        kwargs.pop('marker', None)
+        collection = LineCollection(segments, **kwargs)
+        self.axes.add_collection(collection)
+        self.axes.autoscale_view()
+        drawn_colors = colors.to_rgba_array(collection.get_colors())  # one segment per group
+        group_colors = list(drawn_colors[np.arange(len(labels)) % len(drawn_colors)])
+        self._add_legend_proxies(
+            self.axes.plot, labels=labels, sizes=sizes, group_colors=group_colors,
+        )
+
+    def _batched_scatter(  # pylint: disable=protected-access
+        self, data: DataFrameGroupBy, cmap: str | None, **kwargs: Any,  # type: ignore[type-arg]
+    ) -> None:
+        codes, labels, sizes = self._group_codes(data)
+        if cmap:
+            normalized = colors.Normalize(min(labels), max(labels))
+            group_colors = list(colormaps[cmap](normalized(labels)))
+        else:
+            patches = self.axes._get_patches_for_fill  # type: ignore[attr-defined]
+            group_colors = [patches.get_next_color() for _ in labels]
+        rows = codes >= 0
+        if 'facecolor' not in kwargs and 'color' not in kwargs:
+            kwargs['c'] = colors.to_rgba_array(group_colors)[codes[rows]]
+        points = data.obj[rows]
+        collection = self.axes.scatter(
+            x=points[points.columns[0]], y=points[points.columns[1]], **kwargs,
+        )
+        if 'c' not in kwargs:  # show the color of the first point of each group in the legend
+            drawn_colors = colors.to_rgba_array(collection.get_facecolor())
+            if not drawn_colors.size:  # hollow markers
+                drawn_colors = colors.to_rgba_array(collection.get_edgecolor())
+            first_points = np.unique(codes[rows], return_index=True)[1]
+            group_colors = list(drawn_colors[first_points % len(drawn_colors)])
+        self._add_legend_proxies(
+            self.axes.scatter, labels=labels, sizes=sizes, group_colors=group_colors,
+        )
 
     def bar(self, data: DataFrameGroupBy, **kwargs: Any) -> None:  # type: ignore[type-arg]
         """
         Draw a stacked bar chart.
 
+        The values of each group are summed up per index value. Charts with more than 1,000 bars
+        are drawn with a single compound path per group instead of individual rectangles.
+
         Args:
             data: The grouped data frame to plot (see :doc:`GroupBy <pandas:reference/groupby>`).
             **kwargs: Arguments to forward to :meth:`matplotlib.axes.Axes.bar`.
@@ -244,20 +758,85 @@ class Figure:
         if (data[y_column].min() < 0).any():
             raise ValueError('You cannot have negative y values in a stacked bar chart')
 
-        bottom = DataFrame(columns=[y_column])
-        for group in data.groups:
-            group_data = data.get_group(group)
+        # Calculate the heights (index values × groups) and the bottoms of all bars at once
+        heights = data.obj[y_column].groupby([data.obj.index, data.ngroup()]).sum().unstack()
+        present = heights.notna().to_numpy()
+        heights = heights.fillna(0)
+        bottoms = heights.cumsum(axis=1) - heights
+        labels = list(data.size().index)
+
+        if present.sum() > BAR_PATH_THRESHOLD:
+            self._bar_paths(heights, bottoms, present, labels=labels, **kwargs)
+            return
+        for position, group in enumerate(heights.columns):
+            group_present = present[:, position]
             self.axes.bar(
-                x=group_data.index, height=group_data[y_column],
-                bottom=bottom.reindex(group_data.index, fill_value=0)[y_column],
-                label=group, **kwargs,
+                x=heights.index[group_present], height=heights[group][group_present],
+                bottom=bottoms[group][group_present], label=labels[int(group)], **kwargs,
+            )
+
+    def _bar_paths(  # pylint: disable=too-many-locals, protected-access
+        self,
+        heights: DataFrame,
+        bottoms: DataFrame,
+        present: np.ndarray[Any, Any],
+        labels: list[Any],
+        **kwargs: Any,
+    ) -> None:
+        width = kwargs.pop('width', 0.8)
+        align = kwargs.pop('align', 'center')
+        color = kwargs.pop('color', None)
+        if not matplotlib.rcParams['patch.force_edgecolor']:
+            kwargs.setdefault('edgecolor', 'none')  # like the rectangles of Axes.bar
+        next_color = self.axes._get_patches_for_fill.get_next_color  # type: ignore[attr-defined]
+        self.axes.xaxis.update_units(heights.index)
+        left = np.asarray(self.axes.convert_xunits(heights.index), dtype=float)
+        if align == 'center':
+            left = left - width / 2
+        right = left + width
+        bottom = bottoms.to_numpy(dtype=float)
+        top = bottom + heights.to_numpy(dtype=float)
+
+        for position, group in enumerate(heights.columns):
+            group_present = present[:, position]
+            patch = PathPatch(
+                self._rectangles_path(
+                    left[group_present], right[group_present],
+                    bottom[group_present, position], top[group_present, position],
+                ),
+                facecolor=color if color is not None else next_color(),
+                label=labels[int(group)], **kwargs,
             )
-            bottom = bottom.add(group_data[[y_column]], fill_value=0)
+            patch.sticky_edges.y.append(0)  # type: ignore[union-attr]
+            self.axes.add_artist(patch)
+        self.axes.update_datalim([(left.min(), 0), (right.max(), top.max())])
+        self.axes.autoscale_view()
+
+    @staticmethod
+    def _rectangles_path(
+        left: np.ndarray[Any, Any],
+        right: np.ndarray[Any, Any],
+        bottom: np.ndarray[Any, Any],
+        top: np.ndarray[Any, Any],
+    ) -> MatplotlibPath:
+        """
+        Return a compound path consisting of the given rectangles.
+        """
+        vertices = np.stack([
+            left, bottom, left, top, right, top, right, bottom, left, bottom,
+        ], axis=1).reshape(-1, 2)
+        codes = [MatplotlibPath.MOVETO, *[MatplotlibPath.LINETO] * 3, MatplotlibPath.CLOSEPOLY]
+        return MatplotlibPath(vertices, codes=codes * len(left))
 
     def kde(self, series: Series, rug: bool = True, **kwargs: Any) -> None:
         """
         Draw a kernel density estimation plot.
 
+        For more than 10,000 values, the density is calculated by binning the values on a fine
+        grid and convolving it with the Gaussian kernel (only ``bw_method`` and ``ind`` are
+        supported along with the line arguments), and the rug only has a tick for each pixel
+        column with values.
+
         Args:
             series: The series for which to calculate the kernel density estimate.
             rug: Whether to add a rug plot.
@@ -266,9 +845,85 @@ class Figure:
         """
         kwargs.setdefault('label', None)
         self._set_tics(which='y', tics='auto')
-        series.plot(kind='density', ax=self.axes, marker='', **kwargs)
+        values = series.dropna().to_numpy(dtype=float)
+        ind = self._kde_points(values, kwargs.pop('ind', None))
+        bw_method = kwargs.get('bw_method')
+        if (
+            len(values) > KDE_BINNED_THRESHOLD and kwargs.get('weights') is None
+            and (bw_method in {None, 'scott', 'silverman'} or isinstance(bw_method, (int, float)))
+        ):
+            density = self._binned_kde(values, ind, bw_method=kwargs.pop('bw_method', None))
+            self.axes.plot(ind, density, marker='', **kwargs)
+            self.axes.set_ylabel('Density')
+        else:
+            series.plot(kind='density', ax=self.axes, marker='', ind=ind, **kwargs)
         if rug:
-            self.axes.plot(series, [0] * len(series), '|', color=kwargs.get('color', 'black'))
+            if len(values) > RUG_THRESHOLD:
+                width = (np.max(ind) - np.min(ind)) / self._pixel_columns()
+                _, first = np.unique(np.floor((values - np.min(ind)) / width), return_index=True)
+                values = values[first]
+            self.axes.plot(
+                values, np.zeros(len(values)), '|', color=kwargs.get('color', 'black'),
+            )
+
+    @staticmethod
+    def _kde_points(values: np.ndarray[Any, Any], ind: Any) -> Any:
+        """
+        Return the points where the density is evaluated (like :meth:`pandas.Series.plot`).
+        """
+        if ind is not None and not isinstance(ind, (int, np.integer)):
+            return ind
+        sample_range = np.max(values) - np.min(values)
+        return np.linspace(
+            np.min(values) - 0.5 * sample_range,
+            np.max(values) + 0.5 * sample_range,
+            ind or 1000,
+        )
+
+    @staticmethod
+    def _binned_kde(
+        values: np.ndarray[Any, Any], ind: Any, bw_method: str | float | None,
+    ) -> np.ndarray[Any, Any]:
+        """
+        Return the Gaussian kernel density estimate at the given points.
+
+        The bandwidth is calculated like :class:`scipy.stats.gaussian_kde` does, the values are
+        binned linearly on a regular grid and convolved with the kernel using FFT.
+        """
+        bandwidth = Figure._kde_bandwidth(values, bw_method=bw_method)
+        start, stop = np.min(values) - 5 * bandwidth, np.max(values) + 5 * bandwidth
+        size = int(np.clip(2 ** np.ceil(np.log2(8 * (stop - start) / bandwidth)), *KDE_GRID_SIZE))
+        step = (stop - start) / (size - 1)
+        counts = Figure._linear_bins((values - start) / step, size)
+
+        radius = int(np.ceil(5 * bandwidth / step))
+        offsets = np.arange(-radius, radius + 1)
+        kernel = np.exp(-0.5 * (offsets * step / bandwidth) ** 2)
+        kernel /= bandwidth * np.sqrt(2 * np.pi) * len(values)
+        length = 2 ** int(np.ceil(np.log2(size + len(kernel) - 1)))
+        density = np.fft.irfft(np.fft.rfft(counts, length) * np.fft.rfft(kernel, length), length)
+        density = np.maximum(density[radius:radius + size], 0)
+        grid = start + step * np.arange(size)
+        return np.asarray(np.interp(ind, grid, density, left=0, right=0))
+
+    @staticmethod
+    def _kde_bandwidth(values: np.ndarray[Any, Any], bw_method: str | float | None) -> float:
+        if isinstance(bw_method, (int, float)):
+            factor = float(bw_method)
+        elif bw_method == 'silverman':
+            factor = (len(values) * 0.75) ** -0.2
+        else:
+            factor = len(values) ** -0.2  # Scott's rule
+        return float(factor * np.std(values, ddof=1))
+
+    @staticmethod
+    def _linear_bins(positions: np.ndarray[Any, Any], size: int) -> np.ndarray[Any, Any]:
+        """
+        Split each value between its two neighboring bins in proportion to its distance.
+        """
+        lower = np.minimum(positions.astype(int), size - 2)
+        weights = positions - lower
+        return np.bincount(lower, 1 - weights, size) + np.bincount(lower + 1, weights, size)
 
     def _set_tics(self, which: str, tics: str) -> None:
         axis = getattr(self.axes, f'get_{which}axis')()
@@ -301,31 +956,154 @@ class Figure:
         if tics in {'year', 'month', 'week', 'day'} and which == 'x':
             # Unfortunately axis.set_tick_params does not allow us to set the rotation mode and the
             # horizontal alignment (see https://github.com/matplotlib/matplotlib/issues/13774), so
-            # we must use a draw event callback instead.
-            self._rotate_x_tick_labels_callback = self.figure.canvas.mpl_connect(
-                'draw_event', self._rotate_x_tick_labels,
-            )
+            # we must update the tick labels before each draw instead.
+            self.figure.pre_draw_hooks.append(self._rotate_x_tick_labels)
 
     @staticmethod
     def _make_handle_opaque(legend_handle: artist.Artist, orig_handle: artist.Artist) -> None:
         legend_handle.update_from(orig_handle)
         legend_handle.set_alpha(1)
 
-    def _add_legend(self, *_args: Any, **_kwargs: Any) -> None:
+    def _update_legend(self) -> bool:
         handles, labels = self.axes.get_legend_handles_labels()
-        if handles and labels and not all(not bool(label) or label == 'None' for label in labels):
-            self.axes.legend(handles, labels, loc=self._legend_location, handler_map={
-                PathCollection: HandlerPathCollection(update_func=self._make_handle_opaque),
-            })
+        if self.axes.get_legend() and self._legend_entries == (handles, labels):
+            return False  # up to date
+        self._legend_entries = (handles, labels)
+        if not handles or all(not bool(label) or label == 'None' for label in labels):
+            return False
+        self.axes.legend(handles, labels, loc=self._legend_location, handler_map={
+            PathCollection: HandlerPathCollection(update_func=self._make_handle_opaque),
+        })
+        return True
 
-    def _rotate_x_tick_labels(self, *_args: Any, **_kwargs: Any) -> None:
-        for label in self.axes.get_xticklabels():
+    def _rotate_x_tick_labels(self) -> bool:
+        labels = [
+            label for label in self.axes.xaxis.get_majorticklabels()
+            if label.get_rotation_mode() != 'anchor'  # i.e. not rotated yet
+        ]
+        for label in labels:
             label.set_horizontalalignment('right')
             label.set_rotation_mode('anchor')
             label.set_rotation(30)
+        return bool(labels)
+
+
+FigureSource = Figure | Callable[[], Figure]
+
+
+def _file_format(output: str | PathLike[Any] | IO[Any], file_format: str | None) -> str:
+    if file_format is None and isinstance(output, (str, PathLike)):
+        file_format = Path(output).suffix[1:]
+    return (file_format or matplotlib.rcParams['savefig.format']).lower()
+
+
+def _tell(output: str | PathLike[Any] | IO[Any]) -> int | None:
+    if isinstance(output, (str, PathLike)):
+        return None
+    try:
+        return output.tell()
+    except (AttributeError, OSError):  # e.g. multi-page documents or unseekable streams
+        return None
+
+
+def _written_size(output: str | PathLike[Any] | IO[Any], position: int | None) -> int | None:
+    if isinstance(output, (str, PathLike)):
+        return Path(output).stat().st_size
+    return None if position is None else cast(int, _tell(output)) - position
+
+
+def _element_count(heavy_artist: Line2D | Collection | Patch, columns: int) -> int:
+    if isinstance(heavy_artist, Collection):
+        paths = heavy_artist.get_paths()
+        return max(len(np.asarray(heavy_artist.get_offsets())), sum(len(path) for path in paths))
+    count = len(heavy_artist.get_path())
+    if any(isinstance(effect, LineDecimation) for effect in heavy_artist.get_path_effects()):
+        return min(count, 4 * columns)  # at most four points are drawn in each pixel column
+    return count
+
+
+def _use_params(params: dict[str, Any]) -> None:
+    """
+    Apply the Matplotlib settings of the parent process in a worker process.
+
+    Unpickling this function imports this module first, so the settings are not overwritten by the
+    MindLab styles that are applied on import.
+    """
+    matplotlib.style.use(params)
+
+
+def _build_figure(figure: FigureSource) -> Figure:
+    return figure if isinstance(figure, Figure) else figure()
+
+
+def _save_figure(figure: FigureSource, output: Path, kwargs: dict[str, Any]) -> Path:
+    figure = _build_figure(figure)
+    figure.save(output, **kwargs)
+    pyplot.close(figure.figure)
+    return output
+
+
+def save_all(
+    figures: Iterable[FigureSource],
+    output: str | PathLike[Any] | Iterable[str | PathLike[Any]],
+    workers: int | None = None,
+    **kwargs: Any,
+) -> list[Path]:
+    """
+    Save figures in parallel.
+
+    The figures are rendered in separate processes that use the current Matplotlib settings.
+    Passing functions that create the figures (instead of the figures themselves) is faster, as
+    the figures are then built in parallel and need not be transferred to the other processes.
+    Note that such functions must be defined at the top level of a module.
+
+    Args:
+        figures: The figures or the functions that create them.
+        output: The paths to use for saving the figures (the format is determined by the file
+            extension), or a single PDF path to save the figures as the pages of one document
+            (in which case only building the figures is done in parallel).
+        workers: The number of processes to use. Defaults to the number of processors.
+        **kwargs: Arguments to forward to :meth:`mindlab.Figure.save`.
+
+    Returns:
+        The paths of the saved files.
+
+    """
+    figures = list(figures)
+    single_output = isinstance(output, (str, PathLike))
+    if isinstance(output, (str, PathLike)):
+        if Path(output).suffix.lower() != '.pdf':
+            raise ValueError('The figures can only be saved into a single file in PDF format')
+        outputs = [Path(output)]
+    elif len(outputs := [Path(path) for path in output]) != len(figures):
+        raise ValueError(f'Expected {len(figures)} output paths (got {len(outputs)})')
+
+    if (workers := min(workers or multiprocessing.cpu_count(), len(figures))) <= 1:
+        return _save_figures(map, figures, outputs, pages=single_output, kwargs=kwargs)
+    params = {
+        name: value for name, value in matplotlib.rcParams.items()
+        if name not in STYLE_BLACKLIST
+    }
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=_use_params, initargs=(params,),
+    ) as executor:
+        return _save_figures(
+            executor.map, figures, outputs, pages=single_output, kwargs=kwargs,
+        )
+
 
-        self.figure.canvas.mpl_disconnect(self._rotate_x_tick_labels_callback)
-        self.figure.canvas.draw()
+def _save_figures(
+    map_function: Callable[..., Iterable[Any]], figures: list[FigureSource], outputs: list[Path],
+    pages: bool, kwargs: dict[str, Any],
+) -> list[Path]:
+    if not pages:
+        return list(map_function(_save_figure, figures, outputs, repeat(kwargs)))
+    with PdfPages(outputs[0]) as document:
+        for figure in map_function(_build_figure, figures):
+            figure.save(document, format='pdf', **kwargs)
+            pyplot.close(figure.figure)
+    return outputs
 
 
 class LogFormatter(ticker.LogFormatterSciNotation):
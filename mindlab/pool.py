@@ -0,0 +1,183 @@
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterator
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass, field
+from typing import Any
+
+DEFAULT_MAX_CONNECTIONS = 4
+DEFAULT_IDLE_TIMEOUT = 10 * 60
+DEFAULT_WAIT_TIMEOUT = 60
+
+
+@dataclass
+class PooledConnection:
+    connection: Any
+    generation: int
+    last_used: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class PoolStatus:
+    key: Hashable
+    idle: int
+    in_use: int
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        max_connections: int | None = None,
+        idle_timeout: float | None = None,
+        wait_timeout: float | None = None,
+    ):
+        """
+        Keep database connections open for reuse.
+
+        Connections are pooled per key and checked for liveness before being handed out again.
+
+        Args:
+            max_connections: The maximum number of connections that can be open at the same time.
+                Defaults to 4.
+            idle_timeout: The number of seconds after which an unused connection is closed.
+                Defaults to 10 minutes.
+            wait_timeout: The number of seconds to wait for a connection when all connections are
+                in use. Defaults to 1 minute.
+
+        """
+        self.max_connections = max_connections or DEFAULT_MAX_CONNECTIONS
+        self.idle_timeout = idle_timeout if idle_timeout is not None else DEFAULT_IDLE_TIMEOUT
+        self.wait_timeout = wait_timeout if wait_timeout is not None else DEFAULT_WAIT_TIMEOUT
+        self._idle: dict[Hashable, list[PooledConnection]] = {}
+        self._in_use: dict[Hashable, int] = {}
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def connection(self, key: Hashable, connect: Callable[[], Any]) -> Iterator[Any]:
+        """
+        Provide a live connection for the given key, creating a new one when necessary.
+
+        The open transaction is rolled back when the connection is released, so that idle
+        connections neither keep an old snapshot nor hold locks.
+
+        Args:
+            key: The key identifying equivalent connections.
+            connect: The function to use for creating a new connection.
+
+        """
+        pooled = self._acquire(key, connect)
+        try:
+            yield pooled.connection
+        finally:
+            self._release(key, pooled, reusable=self._rollback(pooled.connection))
+
+    def status(self) -> list[PoolStatus]:
+        with self._condition:
+            self._close_expired()
+            keys = set(self._idle) | set(self._in_use)
+            return [
+                PoolStatus(
+                    key=key, idle=len(self._idle.get(key, [])), in_use=self._in_use.get(key, 0),
+                )
+                for key in sorted(keys, key=str)
+            ]
+
+    def reset(self) -> None:
+        """
+        Close all idle connections and discard the connections that are in use upon release.
+        """
+        with self._condition:
+            self._generation += 1
+            for pooled_connections in self._idle.values():
+                for pooled in pooled_connections:
+                    self._close(pooled.connection)
+            self._idle.clear()
+            self._condition.notify_all()
+
+    def _open_connections(self) -> int:
+        return sum(len(idle) for idle in self._idle.values()) + sum(self._in_use.values())
+
+    def _acquire(self, key: Hashable, connect: Callable[[], Any]) -> PooledConnection:
+        with self._condition:
+            self._close_expired()
+            if idle := self._idle.get(key):
+                pooled = idle.pop()  # most recently used connection first
+            else:
+                if not self._condition.wait_for(self._free_slot, timeout=self.wait_timeout):
+                    raise RuntimeError(f'All {self.max_connections} pooled connections are in use')
+                pooled = None
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            generation = self._generation
+
+        if not pooled:
+            try:
+                return PooledConnection(connection=connect(), generation=generation)
+            except BaseException:
+                self._release(key, pooled=None, reusable=False)
+                raise
+        if self._is_alive(pooled.connection):
+            return pooled
+        self._release(key, pooled, reusable=False)
+        return self._acquire(key, connect)
+
+    def _free_slot(self) -> bool:
+        """
+        Close the least recently used idle connections until a new connection can be opened.
+        """
+        idle = sorted(
+            ((key, pooled) for key, connections in self._idle.items() for pooled in connections),
+            key=lambda item: item[1].last_used,
+        )
+        for key, pooled in idle:
+            if self._open_connections() < self.max_connections:
+                break
+            self._idle[key].remove(pooled)
+            self._close(pooled.connection)
+        return self._open_connections() < self.max_connections
+
+    def _release(self, key: Hashable, pooled: PooledConnection | None, reusable: bool) -> None:
+        with self._condition:
+            self._in_use[key] -= 1
+            if not self._in_use[key]:
+                del self._in_use[key]
+            if pooled:
+                if reusable and pooled.generation == self._generation:
+                    pooled.last_used = time.monotonic()
+                    self._idle.setdefault(key, []).append(pooled)
+                else:
+                    self._close(pooled.connection)
+            self._condition.notify()
+
+    def _close_expired(self) -> None:
+        now = time.monotonic()
+        for key, idle in list(self._idle.items()):
+            expired = [pooled for pooled in idle if now - pooled.last_used > self.idle_timeout]
+            for pooled in expired:
+                idle.remove(pooled)
+                self._close(pooled.connection)
+            if not idle:
+                del self._idle[key]
+
+    @staticmethod
+    def _is_alive(connection: Any) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+        except Exception:  # pylint: disable=broad-exception-caught
+            return False
+        return True
+
+    @staticmethod
+    def _rollback(connection: Any) -> bool:
+        try:
+            connection.rollback()
+        except Exception:  # pylint: disable=broad-exception-caught
+            return False
+        return True
+
+    @staticmethod
+    def _close(connection: Any) -> None:
+        with suppress(Exception):
+            connection.close()
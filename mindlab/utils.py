@@ -1,11 +1,91 @@
+from __future__ import annotations
+
+import importlib
+import importlib.abc
+import importlib.util
+import re
+import sys
 import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from importlib.machinery import ModuleSpec
 from os import getenv
-from typing import Any
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, cast
 
 from logikal_utils.project import tool_config
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 mindlab_config = tool_config('mindlab')
 
+SIZE_UNITS = {'': 1, 'K': 10**3, 'M': 10**6, 'G': 10**9, 'T': 10**12, 'P': 10**15}
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        """
+        Import a module only when one of its attributes is first accessed.
+
+        This keeps the import time of modules that depend on heavy libraries low. Attributes can
+        also be set on the lazy module (like when patching them in tests), which only affects the
+        module using the lazy module.
+
+        Args:
+            name: The fully qualified name of the module.
+
+        """
+        self._module_name = name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(importlib.import_module(self._module_name), name)
+
+    def __repr__(self) -> str:
+        return f'<Lazy module {self._module_name}>'
+
+
+class _ImportCallback(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def __init__(self, name: str, callback: Callable[[], Any]):
+        """
+        Call a function once a module has been imported.
+        """
+        self._name = name
+        self._callback = callback
+        self._loader: importlib.abc.Loader | None = None
+
+    def find_spec(self, fullname: str, *_args: Any, **_kwargs: Any) -> ModuleSpec | None:
+        if fullname != self._name:
+            return None
+        sys.meta_path.remove(self)
+        if not (spec := importlib.util.find_spec(fullname)) or not spec.loader:
+            return spec
+        self._loader, spec.loader = spec.loader, self
+        return spec
+
+    def create_module(self, spec: ModuleSpec) -> ModuleType | None:
+        return cast(importlib.abc.Loader, self._loader).create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        loader = cast(importlib.abc.Loader, self._loader)
+        module.__loader__ = cast(ModuleSpec, module.__spec__).loader = loader
+        loader.exec_module(module)
+        self._callback()
+
+
+def call_on_import(name: str, callback: Callable[[], Any]) -> None:
+    """
+    Call a function once a module has been imported (or immediately if it is already imported).
+    """
+    if name in sys.modules:
+        callback()
+    else:
+        sys.meta_path.insert(0, _ImportCallback(name, callback))
+
+
+if not TYPE_CHECKING:
+    pd = LazyModule('pandas')
+
 
 class Timer:
     def __init__(self) -> None:
@@ -19,6 +99,81 @@ class Timer:
         self.time = time.perf_counter_ns() - self.time  # type: ignore[operator]
 
 
+class PhaseTimer:
+    def __init__(self) -> None:
+        """
+        Measure the time spent in the named phases of an operation (in nanoseconds).
+        """
+        self.phases: dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Measure the time spent in the given phase, adding up the time of repeated phases.
+        """
+        timer = Timer()
+        try:
+            with timer:
+                yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + cast(int, timer.time)
+
+    @property
+    def time(self) -> int:
+        return sum(self.phases.values())
+
+    def summary(self) -> str:
+        return ', '.join(f'{name}: {time / 1e6:,.0f} ms' for name, time in self.phases.items())
+
+
+def parse_size(size: int | float | str) -> int:
+    """
+    Convert a size given in bytes or with a decimal unit suffix (like ``10 GB``) to bytes.
+    """
+    if isinstance(size, (int, float)):
+        return int(size)
+    if not (match := re.fullmatch(r'\s*([\d.]+)\s*([KMGTP]?)B?\s*', size, flags=re.IGNORECASE)):
+        raise ValueError(f'Invalid size "{size}"')
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def _compact_series(series: pd.Series, category_ratio: float) -> pd.Series:
+    if isinstance(series.dtype, pd.ArrowDtype) or pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        downcast = pd.to_numeric(series, downcast='float')
+        return downcast if series.equals(downcast.astype(series.dtype)) else series
+    if pd.api.types.infer_dtype(series, skipna=True) == 'string':
+        if series.nunique() <= category_ratio * len(series):
+            return series.astype('category')
+        if pd.api.types.is_object_dtype(series):
+            return series.astype(pd.StringDtype(storage='pyarrow'))
+    return series
+
+
+def compact_data_frame(data: pd.DataFrame, category_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    Convert the columns of a data frame to data types that use less memory.
+
+    Integers are downcast to the smallest integer type, floats are downcast to 32 bits when this
+    does not lose precision, and string columns are converted to categoricals when they have few
+    unique values or to Arrow-backed strings otherwise (when they use the object type).
+    Arrow-backed columns are left unchanged.
+
+    Args:
+        data: The data frame to compact.
+        category_ratio: The maximum ratio of unique values to the number of rows of string columns
+            that are converted to categoricals.
+
+    """
+    data = data.copy(deep=False)
+    for index, (_, series) in enumerate(data.items()):
+        data.isetitem(index, _compact_series(series, category_ratio=category_ratio).array)
+    return data
+
+
 def get_config(
     name: str,
     value: Any | None = None,
@@ -28,12 +183,15 @@ def get_config(
     if value is not None:
         return value
 
-    if (value := mindlab_config.get(name)) is not None:
-        return value
+    if (value := mindlab_config.get(name)) is None:
+        value = getenv(f'MINDLAB_{name.upper()}')
 
-    value = getenv(f'MINDLAB_{name.upper()}')
-    if value_type == list:
+    if value_type == list and not isinstance(value, list):
         value = value.split(',') if value else []
+    elif value_type == bool and isinstance(value, str):
+        value = value.lower() in {'1', 'true', 'yes', 'on'}
+    elif value_type in {int, float} and isinstance(value, str):
+        value = value_type(value)
 
     if required and value is None:
         raise ValueError(f'You must specify configuration "{name}"')
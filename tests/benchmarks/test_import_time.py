@@ -0,0 +1,49 @@
+import re
+import subprocess  # nosec: used for measuring the import time in a fresh interpreter
+import sys
+
+# Modules that take long to import and must only be imported on first use
+DEFERRED_MODULES = [
+    'awswrangler',
+    'boto3',
+    'google.cloud.bigquery',
+    'ipywidgets',
+    'matplotlib',
+    'numpy',
+    'pandas',
+    'pyarrow',
+    'redshift_connector',
+]
+MAX_IMPORT_TIME_RATIO = 0.5  # relative to the import time of IPython (which is already loaded)
+
+
+def import_times(
+    module: str, cumulative: bool = True, env: dict[str, str] | None = None,
+) -> dict[str, float]:
+    """
+    Return the import time of the modules imported by a module (in milliseconds).
+
+    Args:
+        module: The module to import.
+        cumulative: Whether to include the import time of the nested imports.
+        env: The environment variables to use.
+
+    """
+    process = subprocess.run(  # nosec: the module name is trusted
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True, env=env,
+    )
+    matches = re.finditer(r'^import time:\s+(\d+) \|\s+(\d+) \| +(\S+)$', process.stderr, re.M)
+    return {match[3]: int(match[2 if cumulative else 1]) / 1000 for match in matches}
+
+
+def test_package_import_time() -> None:
+    times = import_times('mindlab')
+    assert not set(times) & set(DEFERRED_MODULES)
+
+
+def test_magics_import_time() -> None:
+    times = import_times('mindlab.magics')
+    assert not set(times) & set(DEFERRED_MODULES)
+    ipython_time = times['IPython']
+    assert times['mindlab.magics'] - ipython_time < MAX_IMPORT_TIME_RATIO * ipython_time
@@ -0,0 +1,169 @@
+import os
+import time
+from collections.abc import Callable
+from functools import partial
+from pathlib import Path
+from typing import Any, cast
+
+import numpy as np
+from pandas import DataFrame, Series, date_range
+from pytest import mark
+
+from mindlab import Figure, save_all
+from mindlab.plot import FONT_MANIFEST, install_fonts
+from tests.benchmarks.test_import_time import import_times
+
+pytestmark = mark.benchmark
+
+MAX_STACKED_BAR_TIME = 60  # seconds (drawing the same chart bar by bar takes minutes)
+MAX_GROUPED_LINE_TIME = 60  # seconds (drawing the lines one by one takes minutes)
+MAX_AGGREGATED_SCATTER_TIME = 30  # seconds
+MAX_AGGREGATED_SCATTER_SIZE = 1_000_000  # bytes
+MAX_LONG_LINE_TIME = 30  # seconds
+MAX_KDE_TIME = 30  # seconds (the exact estimate takes minutes for millions of values)
+MAX_VECTOR_SAVE_TIME = 60  # seconds
+MAX_VECTOR_SAVE_SIZE = 5_000_000  # bytes (the vector scatter plot takes tens of megabytes)
+MAX_PARALLEL_OVERHEAD = 1.5  # ratio compared to a perfectly linear speedup
+WORKER_STARTUP_TIME = 10  # seconds
+MIN_FONT_INSTALL_SPEEDUP = 2  # ratio of the first and the repeated font installation time
+
+
+def test_stacked_bar_time() -> None:
+    groups, dates = 300, date_range('2020-01-01', periods=2000)
+    data = DataFrame(
+        index=np.tile(dates, groups),
+        data={'y': np.random.default_rng(42).random(groups * len(dates))},
+    )
+    data['group'] = np.repeat(np.arange(groups), len(dates))
+
+    start = time.perf_counter()
+    figure = Figure(legend=None)
+    figure.bar(data.groupby('group'), width=1)
+    figure.as_bytes()
+    assert time.perf_counter() - start < MAX_STACKED_BAR_TIME
+    assert len(figure.patches) == groups
+
+
+def test_grouped_line_time() -> None:
+    groups, dates = 2000, date_range('2020-01-01', periods=365)
+    data = DataFrame(
+        index=np.tile(dates, groups),
+        data={'y': np.random.default_rng(42).random(groups * len(dates)).cumsum()},
+    )
+    data['group'] = np.repeat(np.arange(groups), len(dates))
+
+    start = time.perf_counter()
+    figure = Figure()
+    figure.line(data.groupby('group'))
+    figure.as_bytes()
+    assert time.perf_counter() - start < MAX_GROUPED_LINE_TIME
+    assert len(figure.collections) == 1
+
+
+def test_aggregated_scatter_time() -> None:
+    points = 5_000_000
+    generator = np.random.default_rng(42)
+
+    start = time.perf_counter()
+    figure = Figure()
+    figure.scatter(generator.normal(size=points), generator.normal(size=points))
+    image = figure.as_bytes()
+    assert time.perf_counter() - start < MAX_AGGREGATED_SCATTER_TIME
+    assert len(figure.images) == 1
+    assert len(image) < MAX_AGGREGATED_SCATTER_SIZE
+
+
+def test_long_line_time() -> None:
+    points = 10_000_000
+    data = Series(
+        np.random.default_rng(42).normal(size=points).cumsum(),
+        index=date_range('2000-01-01', periods=points, freq='min'),
+    )
+
+    start = time.perf_counter()
+    figure = Figure()
+    figure.line(data)
+    figure.as_bytes()
+    figure.set_xlim(data.index[0], data.index[points // 100])
+    figure.as_bytes()
+    assert time.perf_counter() - start < MAX_LONG_LINE_TIME
+    assert len(figure.lines[0].get_xdata()) == points  # decimated when drawn
+
+
+@mark.parametrize('values', [20_000, 100_000, 1_000_000, 5_000_000])
+def test_kde_time(values: int, record_property: Callable[[str, Any], None]) -> None:
+    data = Series(np.random.default_rng(42).normal(size=values))
+
+    start = time.perf_counter()
+    figure = Figure()
+    figure.kde(data)
+    figure.as_bytes()
+    elapsed = time.perf_counter() - start
+    record_property('time', elapsed)
+    assert elapsed < MAX_KDE_TIME
+    assert len(figure.lines[1].get_xdata()) < values  # rug ticks in the same pixel are merged
+
+
+@mark.parametrize('file_format', ['svg', 'pdf'])
+def test_vector_save(
+    file_format: str, tmp_path: Path, record_property: Callable[[str, Any], None],
+) -> None:
+    points = 200_000
+    generator = np.random.default_rng(42)
+    figure = Figure(title='Title')
+    figure.scatter(generator.normal(size=points), generator.normal(size=points))
+
+    info = figure.save(tmp_path / f'figure.{file_format}')
+    record_property('time', info.seconds)
+    record_property('size', info.size)
+    assert info.rasterized == 1
+    assert info.seconds < MAX_VECTOR_SAVE_TIME
+    assert cast(int, info.size) < MAX_VECTOR_SAVE_SIZE
+
+
+def random_walk_figure(seed: int) -> Figure:
+    figure = Figure(title=f'Random Walk {seed}')
+    x, y = np.random.default_rng(seed).normal(size=(2, 20_000)).cumsum(axis=1)
+    figure.scatter(x, y)
+    return figure
+
+
+def test_save_all_time(tmp_path: Path, record_property: Callable[[str, Any], None]) -> None:
+    figures = [partial(random_walk_figure, seed) for seed in range(16)]
+    outputs = [tmp_path / f'figure-{index}.png' for index in range(len(figures))]
+    workers = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    save_all(figures, outputs, workers=1)
+    sequential = time.perf_counter() - start
+    start = time.perf_counter()
+    save_all(figures, outputs, workers=workers)
+    parallel = time.perf_counter() - start
+    record_property('sequential_time', sequential)
+    record_property('parallel_time', parallel)
+    linear = sequential / min(workers, len(figures))
+    assert parallel < linear * MAX_PARALLEL_OVERHEAD + WORKER_STARTUP_TIME
+
+
+def font_install_time(target_dir: Path) -> float:
+    start = time.perf_counter()
+    install_fonts(target_dir=target_dir)
+    return time.perf_counter() - start
+
+
+def test_plot_import_time(record_property: Callable[[str, float], None], tmp_path: Path) -> None:
+    env = {**os.environ, 'XDG_DATA_HOME': str(tmp_path)}
+    cold_time = import_times('mindlab.plot', cumulative=False, env=env)['mindlab.plot']
+    manifest = tmp_path / 'fonts' / FONT_MANIFEST
+    installed = manifest.stat().st_mtime_ns
+    warm_time = import_times('mindlab.plot', cumulative=False, env=env)['mindlab.plot']
+    assert manifest.stat().st_mtime_ns == installed  # the fonts are not installed again
+    record_property('cold_import_time_ms', cold_time)
+    record_property('warm_import_time_ms', warm_time)
+
+    # Importing Matplotlib dominates the import times, so the font installation is timed directly
+    cold_install_time = min(font_install_time(tmp_path / f'cold-{index}') for index in range(5))
+    warm_install_time = min(font_install_time(tmp_path / 'fonts') for _ in range(5))
+    record_property('cold_font_install_time', cold_install_time)
+    record_property('warm_font_install_time', warm_install_time)
+    assert warm_install_time * MIN_FONT_INSTALL_SPEEDUP < cold_install_time
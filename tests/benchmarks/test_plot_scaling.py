@@ -0,0 +1,146 @@
+import gc
+import json
+import os
+import time
+import tracemalloc
+from collections.abc import Callable
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from matplotlib import pyplot
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure as MatplotlibFigure
+from pandas import Series
+from pytest import mark
+
+from mindlab import Figure, mock_data
+
+pytestmark = mark.benchmark
+
+BASELINES_DIR = Path(__file__).parent / 'baselines'
+REPEATS = 5  # the fastest of the repeated time measurements is used
+# The maximum ratio compared to the baseline and an absolute tolerance for absorbing noise in
+# small measurements; CPU times are relative to the calibration time (see below) and memory is
+# measured in bytes, whereas wall times are only recorded, as they depend on the machine load
+MAX_REGRESSIONS = {'cpu_time': (2, 0.1), 'memory': (1.2, 100_000)}
+
+
+def line(days: int) -> Callable[[Figure], None]:
+    data = mock_data.stock_prices(companies=3, days=days)
+    return lambda figure: figure.line(data)
+
+
+def scatter(days: int) -> Callable[[Figure], None]:
+    data = mock_data.stock_prices(companies=2, days=days)
+    x, y = (group['stock_price'].to_numpy() for _, group in data)
+    return lambda figure: figure.scatter(x, y)
+
+
+def bar(days: int) -> Callable[[Figure], None]:
+    data = mock_data.stock_prices(companies=3, days=days)
+    return lambda figure: figure.bar(data, width=1)
+
+
+def kde(days: int) -> Callable[[Figure], None]:
+    data = Series(np.concatenate([
+        group['stock_price'].to_numpy()
+        for _, group in mock_data.stock_prices(companies=10, days=days)
+    ]))
+    return lambda figure: figure.kde(data)
+
+
+def measure_time(function: Callable[[], Any]) -> tuple[float, float]:
+    """
+    Return the wall time and the CPU time of a function call (in seconds).
+    """
+    gc.collect()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    function()
+    return time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+
+def measure_memory(function: Callable[[], Any]) -> int:
+    """
+    Return the peak memory allocated during a function call (in bytes).
+
+    Only allocations made by Python and NumPy are traced (e.g. not the Agg canvas buffer). Tracing
+    slows down Python code considerably, so the wall time must be measured in a separate call.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure_calibration_time() -> float:
+    """
+    Return the CPU time of rendering a plain Matplotlib figure (in seconds).
+
+    The CPU times are stored relative to this time, which makes the baselines comparable across
+    machines and independent of changes in this package.
+    """
+    x, y = np.random.default_rng(42).normal(size=(2, 30_000)).cumsum(axis=1)
+
+    def render() -> None:
+        figure = MatplotlibFigure()
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+        axes.plot(x, y)
+        axes.scatter(x[::10], y[::10])
+        figure.savefig(BytesIO(), format='png')
+
+    return min(measure_time(render)[1] for _ in range(REPEATS))
+
+
+def check_baseline(name: str, measurements: dict[str, float]) -> None:
+    path = BASELINES_DIR / f'{name}.json'
+    if os.getenv('UPDATE_BENCHMARK_BASELINES'):
+        path.write_text(json.dumps(measurements, indent=2, sort_keys=True) + '\n')
+    assert path.exists(), 'Missing baseline (set UPDATE_BENCHMARK_BASELINES=1 to create it)'
+    baseline = json.loads(path.read_text())
+    for key, value in measurements.items():
+        for suffix, (ratio, tolerance) in MAX_REGRESSIONS.items():
+            if key.endswith(suffix):
+                limit = baseline[key] * ratio + tolerance
+                assert value < limit, f'{key} regressed from {baseline[key]:.4g} to {value:.4g}'
+
+
+@mark.parametrize(('method', 'days'), [
+    (line, 1_000), (line, 10_000), (line, 50_000),
+    (scatter, 1_000), (scatter, 10_000), (scatter, 50_000),
+    (bar, 100), (bar, 1_000), (bar, 10_000),
+    (kde, 1_000), (kde, 10_000), (kde, 50_000),
+])
+def test_plot_scaling(
+    method: Callable[[int], Callable[[Figure], None]],
+    days: int,
+    record_property: Callable[[str, Any], None],
+) -> None:
+    plot = method(days)
+    calibration_time = measure_calibration_time()  # under the same load as the measurements
+    plot(Figure())  # warm up (e.g. for importing lazily loaded modules)
+    results: dict[str, list[tuple[float, float]]] = {'plot': [], 'render': []}
+    for _ in range(REPEATS):
+        figure = Figure()
+        results['plot'].append(measure_time(partial(plot, figure)))
+        results['render'].append(measure_time(figure.as_bytes))
+    measurements: dict[str, float] = {}
+    for name, times in results.items():
+        wall_time, cpu_time = (min(values) for values in zip(*times))
+        record_property(f'{name}_wall_time', wall_time)
+        record_property(f'{name}_cpu_time', cpu_time)
+        measurements[f'{name}_relative_cpu_time'] = cpu_time / calibration_time
+    figure = Figure()
+    measurements['plot_memory'] = measure_memory(lambda: plot(figure))
+    measurements['render_memory'] = measure_memory(figure.as_bytes)
+    pyplot.close('all')
+    record_property('calibration_cpu_time', calibration_time)
+    for key, value in measurements.items():
+        record_property(key, value)
+    check_baseline(f'{method.__name__}-{days}', measurements)
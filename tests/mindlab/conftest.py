@@ -1,10 +1,12 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from os import environ
 from pathlib import Path
 
 from logikal_browser.utils import assert_image_equal
 from logikal_utils.testing import hide_traceback
+from matplotlib import pyplot
 from numpy import random
-from pytest import fixture
+from pytest import TempPathFactory, fixture
 from pytest_mock import MockerFixture
 
 from mindlab.magics import MindLabMagics
@@ -14,10 +16,18 @@ CheckFigure = Callable[[Figure, str], None]
 
 
 @fixture
-def magics(mocker: MockerFixture) -> MindLabMagics:
+def magics(mocker: MockerFixture, tmp_path_factory: TempPathFactory) -> MindLabMagics:
+    state_home = str(tmp_path_factory.mktemp('state'))
+    mocker.patch.dict(environ, {'XDG_STATE_HOME': state_home, 'MINDLAB_HISTORY': 'false'})
     return MindLabMagics(shell=mocker.Mock(parent=None), parent=None)  # nosec: the shell is mocked
 
 
+@fixture(autouse=True)
+def close_figures() -> Iterator[None]:
+    yield
+    pyplot.close('all')  # figures are retained by pyplot until explicitly closed
+
+
 @fixture
 def generator() -> random.Generator:
     return random.default_rng(seed=42)
@@ -0,0 +1,34 @@
+from threading import Event
+
+from pytest import raises
+
+from mindlab.background import BackgroundQueries
+
+
+def test_background_queries() -> None:
+    queries = BackgroundQueries(max_workers=1)
+    event = Event()
+    results: list[str] = []
+
+    running = queries.submit(magic='test', sql='running', run=event.wait, on_success=str)
+    failed = queries.submit(magic='test', sql='failed', run=lambda: 1 / 0)
+    finished = queries.submit(
+        magic='test', sql='finished', run=lambda: 'result', on_success=results.append,
+    )
+    assert running.status == 'running'
+    assert running.elapsed >= 0
+    queries.clear()
+    assert len(queries.queries()) == 3
+
+    event.set()
+    assert finished.result(timeout=10) == 'result'
+    assert results == ['result']
+    assert running.status == 'finished'
+    with raises(ZeroDivisionError):
+        failed.result()
+    assert failed.status == 'failed'
+    assert [query.id for query in queries.queries()] == [1, 2, 3]
+
+    queries.clear()
+    assert not queries.queries()
+    assert queries.submit(magic='test', sql='next', run=lambda: None).id == 4
@@ -0,0 +1,84 @@
+import os
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pyarrow
+from pandas import ArrowDtype, DataFrame
+from pandas.testing import assert_frame_equal
+
+from mindlab.cache import DiskCache, RenderCache, ResultCache
+
+
+def write(content: bytes) -> Callable[[Path], None]:
+    def writer(path: Path) -> None:
+        path.write_bytes(content)
+    return writer
+
+
+def test_disk_cache(tmp_path: Path) -> None:
+    cache = DiskCache(directory=tmp_path, suffix='.bin')
+    key = cache.key('test', {'context': 1})
+    assert key == cache.key('test', {'context': 1})
+    assert key != cache.key('test', {'context': 2})
+
+    assert cache.get(key) is None
+    cache.put(key, write(b'data'))
+    assert (path := cache.get(key))
+    assert path.read_bytes() == b'data'
+    assert list(tmp_path.iterdir()) == [path]  # no temporary files left behind
+
+    cache.clear()
+    assert cache.get(key) is None
+
+
+def test_disk_cache_ttl(tmp_path: Path) -> None:
+    cache = DiskCache(directory=tmp_path, ttl=60)
+    path = cache.put('key', write(b'data'))
+    assert cache.get('key')
+    os.utime(path, times=(time.time(), time.time() - 120))
+    assert cache.get('key') is None
+    assert not path.exists()
+
+
+def test_disk_cache_eviction(tmp_path: Path) -> None:
+    cache = DiskCache(directory=tmp_path, max_size='10B')
+    for index, key in enumerate(['first', 'second']):
+        path = cache.put(key, write(b'data'))
+        os.utime(path, times=(time.time() - 100 + index, time.time()))
+    assert cache.get('first')  # marks the first entry as the most recently used one
+    cache.put('third', write(b'data'))
+    assert cache.get('first')
+    assert cache.get('second') is None
+    assert cache.get('third')
+
+
+def test_result_cache(tmp_path: Path) -> None:
+    cache = ResultCache(directory=tmp_path)
+    key = cache.query_key('  SELECT *\n\n  FROM test  ', project='test')
+    assert key == cache.query_key('SELECT *\nFROM test', project='test')
+    assert key != cache.query_key('SELECT *\nFROM test', project='other')
+
+    data = DataFrame({'id': [1, 2, 3], 'name': ['a', 'b', None]})
+    assert cache.load(key) is None
+    cache.store(key, data)
+    assert (actual := cache.load(key)) is not None
+    assert_frame_equal(actual, data)
+
+
+def test_result_cache_arrow(tmp_path: Path) -> None:
+    cache = ResultCache(directory=tmp_path)
+    table = pyarrow.table({'id': [1, 2, 3], 'name': ['a', 'b', None]})
+    cache.store('key', table)
+    assert (actual_table := cache.load('key', arrow='table')) is not None
+    assert actual_table.equals(table)
+    assert (actual := cache.load('key', arrow='pandas')) is not None
+    assert_frame_equal(actual, table.to_pandas(types_mapper=ArrowDtype))
+
+
+def test_render_cache(tmp_path: Path) -> None:
+    cache = RenderCache(directory=tmp_path)
+    assert cache.load('key') is None
+    cache.store('key', b'image')
+    assert cache.load('key') == b'image'
+    assert (cache.ttl, cache.max_size) == (None, 10**9)
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from mindlab.history import QueryHistory, percentile
+
+
+def test_percentile() -> None:
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 95) == 5
+    assert percentile(values, 0) == 1
+
+
+def test_query_history(tmp_path: Path) -> None:
+    history = QueryHistory(path=tmp_path / 'history' / 'history.sqlite')
+    assert not history.entries()
+
+    history.record('bigquery', '  SELECT 1\n\n  FROM test ', {'auth': 10**6, 'execution': 10**7})
+    for time in [1, 2, 3]:
+        history.record('redshift', f'SELECT {time}', {'execution': time * 10**6}, rows=time)
+    history.record('bigquery', 'SELECT 2', {'execution': 5 * 10**7}, bytes_processed=100)
+
+    entry = history.entries(magic='bigquery')[0]
+    assert entry.sql == 'SELECT 1\nFROM test'
+    assert len(entry.sql_hash) == 64
+    assert entry.phases == {'auth': 1.0, 'execution': 10.0}
+    assert entry.total_ms == 11
+    assert entry.rows is None
+    assert entry.started.tzinfo
+    assert len(history.entries()) == 5
+
+    summary = history.summary()
+    assert [(item.magic, item.count, item.p50_ms, item.p95_ms) for item in summary] == [
+        ('bigquery', 2, 11, 50), ('redshift', 3, 2, 3),
+    ]
+    assert [entry.total_ms for entry in history.slowest(limit=2)] == [50, 11]
+    assert [entry.sql for entry in history.slowest(magic='redshift')] == [
+        'SELECT 3', 'SELECT 2', 'SELECT 1',
+    ]
+    assert history.slowest(magic='redshift', limit=1)[0].rows == 3
+    assert history.entries(magic='bigquery')[1].bytes_processed == 100
+
+    history.clear()
+    assert not history.summary()
+
+
+def test_query_history_default_path(tmp_path: Path) -> None:
+    assert QueryHistory().path.name == 'history.sqlite'
+    assert QueryHistory(path=str(tmp_path)).path == tmp_path
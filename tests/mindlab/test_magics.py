@@ -1,23 +1,84 @@
 import re
-from datetime import date
+import subprocess  # nosec: used for plotting in a fresh interpreter
+import sys
+from datetime import date, datetime, time
+from os import environ
 from pathlib import Path
+from typing import Any
+from unittest.mock import Mock
 
+import pyarrow
 import redshift_connector
 from botocore import exceptions as aws_exceptions
+from google.auth.exceptions import RefreshError
 from google.cloud.exceptions import BadRequest
-from pandas import DataFrame, Series, read_csv
+from pandas import NA, ArrowDtype, DataFrame, Series, read_csv
 from pandas.testing import assert_frame_equal
 from pytest import CaptureFixture
 from pytest_mock import MockerFixture
+from redshift_connector.interval import Interval
 
 from mindlab.magics import MindLabMagics, load_ipython_extension
 from mindlab.utils import mindlab_config
 
+REDSHIFT_DTYPES = {'order_id': 'Int64', 'sku': 'string', 'quantity': 'Int64'}  # test data types
+
+
+def redshift_results(connect: Mock, data: DataFrame) -> Mock:
+    """
+    Set the rows returned by the cursors of a mocked Redshift connection.
+    """
+    cursor: Mock = connect.return_value.cursor.return_value.__enter__.return_value
+    cursor.description = [(name.encode(), 25) for name in data.columns]
+    cursor.fetchall.return_value = list(data.itertuples(index=False, name=None))
+    return cursor
+
+
+def executed_queries(cursor: Mock) -> list[str]:
+    """
+    Return the queries executed by a mocked Redshift cursor (excluding connection health checks).
+    """
+    return [call.args[0] for call in cursor.execute.call_args_list if call.args[0] != 'SELECT 1']
+
 
 def test_load_extension(mocker: MockerFixture) -> None:
     ipython = mocker.Mock()
     load_ipython_extension(ipython)
     ipython.register_magics.assert_called_with(MindLabMagics)
+    assert Series([date(2024, 1, 1)], dtype='dbdate').dtype.name == 'dbdate'
+
+
+def test_plot_styles() -> None:
+    code = '\n'.join([
+        'from unittest.mock import Mock',
+        'import pandas',
+        'from mindlab.magics import MindLabMagics',
+        'MindLabMagics(shell=Mock(parent=None), parent=None)',
+        "assert 'matplotlib' not in sys.modules",
+        'print(pandas.Series([1, 2]).plot().lines[0].get_fillstyle())',
+    ])
+    process = subprocess.run(  # nosec: the code is trusted
+        [sys.executable, '-c', f'import sys\n{code}'],
+        capture_output=True, text=True, check=True,
+        env={**environ, 'MPLBACKEND': 'agg', 'MINDLAB_HISTORY': 'false'},
+    )
+    assert process.stdout == 'none\n'  # the markers of the MindLab style are not filled
+
+
+def test_pandas_options(mocker: MockerFixture) -> None:
+    set_option = mocker.patch('mindlab.magics.pd.set_option')
+    shell = mocker.Mock(parent=None)
+    mocker.patch.dict(sys.modules)
+    pandas = sys.modules.pop('pandas')  # pandas has not been imported yet
+    magics = MindLabMagics(shell=shell, parent=None)  # nosec: the shell is mocked
+    assert not set_option.called
+    set_pandas_options = magics._set_pandas_options  # pylint: disable=protected-access
+    shell.events.register.assert_called_with('post_run_cell', set_pandas_options)
+
+    sys.modules['pandas'] = pandas
+    magics._set_pandas_options()  # pylint: disable=protected-access
+    magics._set_pandas_options()  # pylint: disable=protected-access
+    assert set_option.call_count == 2
 
 
 def test_mindlab_config(
@@ -61,35 +122,642 @@ def test_bigquery_error(
     capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
 ) -> None:
     client = mocker.patch('mindlab.magics.bigquery.Client')
-    query = client.return_value.__enter__.return_value.query.return_value
-    query.to_dataframe.side_effect = BadRequest('Test')  # type: ignore[no-untyped-call]
+    query = client.return_value.query.return_value
+    query.result.side_effect = BadRequest('Test')  # type: ignore[no-untyped-call]
     assert magics.bigquery(line='', cell='') is None
     assert capsys.readouterr().err == 'Error: 400 Test\n'
 
 
+def test_bigquery_client_cache(mocker: MockerFixture, magics: MindLabMagics) -> None:
+    gcp_auth = mocker.patch.object(magics, '_gcp_auth')
+    credentials = gcp_auth.credentials.return_value
+    credentials.expired = False
+    client = mocker.patch('mindlab.magics.bigquery.Client')
+    mocker.patch('mindlab.magics.display')
+
+    magics.bigquery(line='--info', cell='SELECT 1')
+    magics.bigquery(line='', cell='SELECT 1')
+    assert client.call_count == 1
+    magics.bigquery(line='--project other', cell='SELECT 1')
+    assert client.call_count == 2
+
+    # Test credential refreshing
+    credentials.expired = True
+    magics.bigquery(line='', cell='SELECT 1')
+    assert credentials.refresh.called
+    assert client.call_count == 2
+
+    credentials.refresh.side_effect = RefreshError('Test')  # type: ignore[no-untyped-call]
+    magics.bigquery(line='', cell='SELECT 1')
+    assert client.return_value.close.called
+    assert client.call_count == 3
+
+
+def test_bigquery_arrow(mocker: MockerFixture, magics: MindLabMagics) -> None:
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    read_client = mocker.patch('mindlab.magics.bigquery_storage.BigQueryReadClient')
+    query = mocker.patch('mindlab.magics.bigquery.Client').return_value.query.return_value
+    to_arrow_iterable = query.result.return_value.to_arrow_iterable
+    table = pyarrow.table({'id': [1, 2], 'name': ['a', 'b']})
+    to_arrow_iterable.return_value = table.to_batches()
+    mocker.patch('mindlab.magics.display')
+
+    actual = magics.bigquery(line='--arrow --streams 4 --info', cell='SELECT 1')
+    assert_frame_equal(actual, table.to_pandas(types_mapper=ArrowDtype))
+    assert to_arrow_iterable.call_args.kwargs == {
+        'bqstorage_client': read_client.return_value, 'max_stream_count': 4,
+    }
+    assert magics.bigquery(line='--arrow table', cell='SELECT 1').equals(table)
+    assert read_client.call_count == 1
+    assert_frame_equal(
+        magics.bigquery(line='--arrow table --transpose', cell='SELECT 1'),
+        table.to_pandas(types_mapper=ArrowDtype).transpose(),
+    )
+
+    # Test empty results
+    to_arrow_iterable.return_value = []
+    query.to_arrow.return_value = table.slice(length=0)
+    assert not magics.bigquery(line='--arrow table', cell='SELECT 1').num_rows
+
+
+def test_bigquery_data_types(mocker: MockerFixture, magics: MindLabMagics) -> None:
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    rows = mocker.patch('mindlab.magics.bigquery.Client').return_value.query.return_value.result
+    period = pyarrow.struct([('start', pyarrow.date32()), ('end', pyarrow.date32())])
+    rows.return_value.to_arrow.return_value = pyarrow.table({
+        'flag': [True, None],
+        'count': pyarrow.array([1, None], type=pyarrow.int32()),
+        'date': [date(2020, 1, 1), None],
+        'time': [time(12), None],
+        'period': pyarrow.array([{'start': date(2020, 1, 1), 'end': None}, None], type=period),
+        'timestamp': [datetime(2020, 1, 1), None],
+        'value': [1.5, None],
+    })
+    actual = magics.bigquery(line='', cell='SELECT 1')
+    assert actual.dtypes.astype(str).to_list() == [
+        'boolean', 'Int64', 'dbdate', 'dbtime',
+        'struct<start: date32[day], end: date32[day]>[pyarrow]', 'datetime64[us]', 'float64',
+    ]
+
+    # Test values that are out of the bounds of nanosecond timestamps
+    rows.return_value.to_arrow.return_value = pyarrow.table({
+        'date': [date(1, 1, 1)], 'timestamp': [datetime(9999, 1, 1)],
+    })
+    actual = magics.bigquery(line='', cell='SELECT 2')
+    assert actual.to_dict('list') == {'date': [date(1, 1, 1)], 'timestamp': [datetime(9999, 1, 1)]}
+
+
+def test_bigquery_cache(mocker: MockerFixture, tmp_path: Path, magics: MindLabMagics) -> None:
+    mocker.patch.dict(mindlab_config, {'cache_dir': str(tmp_path)})
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    client = mocker.patch('mindlab.magics.bigquery.Client').return_value
+    client.project = 'test'
+    rows = client.query.return_value.result.return_value
+    rows.to_arrow.return_value = pyarrow.table({'id': [1, 2, 3]})
+    expected = DataFrame({'id': [1, 2, 3]}, dtype='Int64')
+    display = mocker.patch('mindlab.magics.display')
+
+    for line in ['--cache --info', '--cache --info']:
+        assert_frame_equal(magics.bigquery(line=line, cell='SELECT 1'), expected)
+    assert client.query.call_count == 1
+    assert 'returned from local cache' in display.call_args.args[0].value
+    client.query.return_value.cache_hit = True
+    magics.bigquery(line='--refresh --info', cell='SELECT 1')
+    assert 'none (returned from cache)' in display.call_args.args[0].value
+    assert 'Local cache: <b>refreshed</b>' in display.call_args.args[0].value
+
+
 def test_redshift(mocker: MockerFixture, magics: MindLabMagics) -> None:
     query = 'SELECT * FROM test_mindlab.order_line_items'
     # Note: we don't run a Redshift cluster at the moment, so we will mock the response
     # - This should be replaced with a proper integration test once there is a test cluster to use
     # - The appropriate Glue Data Catalog connection should also be added to pyproject.toml then
-    expected = read_csv(Path(__file__).parent / 'data/order_line_items.csv')
-    mocker.patch('mindlab.magics.awswrangler.redshift.connect')
-    read_sql_query = mocker.patch('mindlab.magics.awswrangler.redshift.read_sql_query')
-    read_sql_query.return_value = expected
+    data = read_csv(Path(__file__).parent / 'data/order_line_items.csv')
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    cursor = redshift_results(connect, data)
     actual = magics.redshift(line='--info --connection test', cell=query)
-    assert_frame_equal(actual, expected)
+    assert_frame_equal(actual, data.astype(REDSHIFT_DTYPES))
+    assert cursor.execute.call_args.args == (query, None)
+
+    # Test empty results
+    cursor.fetchall.return_value = []
+    assert_frame_equal(
+        magics.redshift(line='--connection test', cell=query),
+        DataFrame(columns=data.columns),
+    )
+
+    # Test values that cannot be converted to Arrow data types
+    cursor.description = [('duration', 1186)]
+    cursor.fetchall.return_value = [(Interval(microseconds=1),), (None,)]
+    actual = magics.redshift(line='--connection test', cell=query)
+    assert actual['duration'].to_list() == [str(Interval(microseconds=1)), NA]
+    assert actual['duration'].dtype == 'string'
+
+    # Test connection reuse
+    magics.redshift(line='--connection test', cell=query)
+    assert connect.call_count == 1
 
 
 def test_redshift_error(
     capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
 ) -> None:
-    mocker.patch('mindlab.magics.awswrangler.redshift.connect')
-    read_sql_query = mocker.patch('mindlab.magics.awswrangler.redshift.read_sql_query')
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    cursor = redshift_results(connect, DataFrame())
 
-    read_sql_query.side_effect = aws_exceptions.UnauthorizedSSOTokenError
+    cursor.execute.side_effect = aws_exceptions.UnauthorizedSSOTokenError
     assert magics.redshift(line='--connection test', cell='') is None
     assert re.search('Error: .* SSO session .* invalid', capsys.readouterr().err)
 
-    read_sql_query.side_effect = redshift_connector.error.Error('Test')
+    cursor.execute.side_effect = redshift_connector.error.Error('Test')
     assert magics.redshift(line='--connection test', cell='') is None
     assert re.match('Error: Test', capsys.readouterr().err)
+
+
+def test_redshift_cache(mocker: MockerFixture, tmp_path: Path, magics: MindLabMagics) -> None:
+    mocker.patch.dict(mindlab_config, {'cache_dir': str(tmp_path)})
+    data = read_csv(Path(__file__).parent / 'data/order_line_items.csv')
+    expected = data.astype(REDSHIFT_DTYPES)
+    cursor = redshift_results(mocker.patch('mindlab.magics.awswrangler.redshift.connect'), data)
+    query = 'SELECT * FROM test_mindlab.order_line_items'
+
+    assert_frame_equal(magics.redshift(line='--connection test', cell=query), expected)
+    assert not list(tmp_path.iterdir())  # caching is disabled by default
+
+    for line in ['--cache', '--cache --info', '--refresh']:
+        actual = magics.redshift(line=f'--connection test {line}', cell=query)
+        assert_frame_equal(actual, expected)
+    assert len(executed_queries(cursor)) == 3
+
+    assert_frame_equal(magics.redshift(line='--connection test --no-cache', cell=query), expected)
+    assert len(executed_queries(cursor)) == 4
+
+
+def test_redshift_cache_error(
+    capsys: CaptureFixture[str], mocker: MockerFixture, tmp_path: Path, magics: MindLabMagics,
+) -> None:
+    mocker.patch.dict(mindlab_config, {'cache_dir': str(tmp_path)})
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    redshift_results(connect, DataFrame([[1, 2]], columns=['id', 'id']))
+    assert magics.redshift(line='--connection test --cache', cell='') is not None
+    assert re.match('Warning: could not cache', capsys.readouterr().err)
+
+    redshift_results(connect, expected := DataFrame({'id': [1, 2]}, dtype='Int64'))
+    mocker.patch('mindlab.cache.DiskCache.put', side_effect=OSError('No space left on device'))
+    assert_frame_equal(magics.redshift(line='--connection test --cache', cell=''), expected)
+    assert 'No space left on device' in capsys.readouterr().err
+
+
+def test_redshift_pool(
+    capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
+) -> None:
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    redshift_results(connect, DataFrame())
+    magics.redshift(line='--connection test --organization test.org', cell='')
+    magics.redshift_pool(line='')
+    status = capsys.readouterr().out
+    assert status.startswith('Open connections: 1 (limit: 4, idle timeout: 600 s)\n')
+    assert '- test (organization: test.org, region: ' in status
+    assert status.endswith('1 idle, 0 in use\n')
+
+    magics.redshift_pool(line='reset')
+    assert connect.return_value.close.called
+    magics.redshift_pool(line='status')
+    status = capsys.readouterr().out
+    assert status.endswith('Open connections: 0 (limit: 4, idle timeout: 600 s)\n')
+
+
+def test_redshift_unload(mocker: MockerFixture, magics: MindLabMagics) -> None:
+    mocker.patch.dict(mindlab_config, {'redshift_unload_path': 's3://bucket/staging/'})
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    cursor = redshift_results(connect, DataFrame({'id': [1]}))
+    unload = mocker.patch('mindlab.magics.awswrangler.redshift.unload_to_files')
+    read_parquet = mocker.patch('mindlab.magics.awswrangler.s3.read_parquet')
+    delete_objects = mocker.patch('mindlab.magics.awswrangler.s3.delete_objects')
+    display = mocker.patch('mindlab.magics.display')
+
+    read_parquet.return_value = expected = DataFrame({'id': [1, 2, 3]})
+    actual = magics.redshift(line='--connection test --unload --info', cell='')
+    assert_frame_equal(actual, expected)
+    path = unload.call_args.kwargs['path']
+    assert re.match('s3://bucket/staging/mindlab-unload-[0-9a-f]+/$', path)
+    assert read_parquet.call_args.kwargs['path'] == path
+    assert delete_objects.call_args.kwargs['path'] == path
+    assert re.search(
+        r'execution: [\d,]+ ms, download \+ conversion: [\d,]+ ms\)',
+        display.call_args.args[0].value,
+    )
+
+    # Test automatic mode
+    mocker.patch.dict(mindlab_config, {'redshift_unload_threshold': 1000})
+    cursor.fetchall.return_value = [['XN Seq Scan on test  (cost=0.00..1.00 rows=1000 width=4)']]
+    magics.redshift(line='--connection test --info', cell='')
+    assert unload.call_count == 2
+    assert 'estimate: ' in display.call_args.args[0].value
+    cursor.fetchall.return_value = [['XN Seq Scan on test  (cost=0.00..1.00 rows=999 width=4)']]
+    magics.redshift(line='--connection test --info', cell='')
+    cursor.fetchall.return_value = []
+    magics.redshift(line='--connection test', cell='')
+    magics.redshift(line='--connection test --no-unload', cell='')
+    assert unload.call_count == 2
+    assert executed_queries(cursor)[-3:] == ['EXPLAIN ', '', '']  # no estimate without UNLOAD
+
+
+def test_background_queries(
+    capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
+) -> None:
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    cursor = redshift_results(connect, expected := DataFrame({'id': [1, 2, 3]}, dtype='Int64'))
+
+    query = magics.redshift(line='data --connection test --background', cell='SELECT\n  1')
+    assert_frame_equal(query.result(timeout=10), expected)
+    assert_frame_equal(
+        magics.shell.push.call_args_list[0].args[0]['data'],  # type: ignore[union-attr]
+        expected,
+    )
+    assert query.status == 'finished'
+    assert re.match(
+        r'<Background query 1 \(redshift, finished after .* s, output: data\)>', repr(query),
+    )
+
+    cursor.execute.side_effect = redshift_connector.error.Error('Test')
+    failed_query = magics.redshift(line='--connection test --background', cell='SELECT 2')
+    assert failed_query.result(timeout=10) is None
+    assert failed_query.status == 'failed'
+    assert magics.shell.push.call_count == 1  # type: ignore[union-attr]
+
+    capsys.readouterr()
+    magics.queries(line='')
+    assert re.match(
+        r'1: redshift -> data \(finished, .* s\): SELECT 1\n'
+        r'2: redshift \(failed, .* s\): SELECT 2\n$',
+        capsys.readouterr().out,
+    )
+    magics.queries(line='--clear')
+    magics.queries(line='')
+    assert not capsys.readouterr().out
+
+
+def test_multiquery(
+    capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
+) -> None:
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    query = mocker.patch('mindlab.magics.bigquery.Client').return_value.query.return_value
+    query.result.return_value.to_arrow.return_value = pyarrow.table({'user': [1, 2]})
+    users = DataFrame({'user': [1, 2]}, dtype='Int64')
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    orders = DataFrame({'order': [1, 2, 3]}, dtype='Int64')
+
+    def execute(sql: str, parameters: object) -> None:  # pylint: disable=unused-argument
+        if 'unexpected' in sql:
+            raise RuntimeError('Unexpected')
+        if 'orders' not in sql:
+            raise redshift_connector.error.Error('Test')
+
+    redshift_results(connect, orders).execute.side_effect = execute
+    display = mocker.patch('mindlab.magics.display')
+
+    assert magics.multiquery(line='--info', cell=(
+        '\n-- bigquery users --project test\nSELECT * FROM users\n'
+        '-- redshift orders --connection test\nSELECT *\nFROM orders\n'
+        '--redshift failed --connection test\nSELECT 1\n'
+        '-- redshift unexpected --connection test\nSELECT unexpected\n'
+    )) is None
+    pushed = {
+        name: data
+        for call in magics.shell.push.call_args_list  # type: ignore[union-attr]
+        for name, data in call.args[0].items()
+    }
+    assert list(pushed) == ['users', 'orders']
+    assert_frame_equal(pushed['users'], users)
+    assert_frame_equal(pushed['orders'], orders)
+    assert sorted(capsys.readouterr().err.splitlines()) == [  # the queries run concurrently
+        'Error: Test', 'Error: the redshift query "unexpected" failed (Unexpected)',
+    ]
+    details = display.call_args.args[0].value
+    assert display.call_count == 1
+    assert re.search(r'users \(bigquery\): <b>[\d,]+ ms</b>', details)
+    assert 'failed (redshift): <b>failed</b>' in details
+    assert 'unexpected (redshift): <b>failed</b>' in details
+    assert 'sum of queries' in details
+
+    # Test invalid cells
+    magics.multiquery(line='', cell='SELECT 1')
+    assert 'must be preceded' in capsys.readouterr().err
+    magics.multiquery(line='', cell='-- redshift\nSELECT 1')
+    assert 'output variable of the redshift query is missing' in capsys.readouterr().err
+    magics.multiquery(line='', cell='-- redshift data\n')
+    assert 'The redshift query "data" is empty' in capsys.readouterr().err
+    magics.multiquery(line='', cell='\n')
+    assert 'No queries have been provided' in capsys.readouterr().err
+    magics.multiquery(line='', cell='-- redshift data --incremental id\nSELECT 1')
+    assert 'Incremental queries are not supported' in capsys.readouterr().err
+    magics.multiquery(line='', cell='-- redshift data --background\nSELECT 1')
+    assert 'Background queries are not supported' in capsys.readouterr().err
+
+
+def test_chunksize(
+    capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
+) -> None:
+    mocker.patch.dict(mindlab_config, {'redshift_unload_path': 's3://bucket/staging/'})
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    query = mocker.patch('mindlab.magics.bigquery.Client').return_value.query.return_value
+    chunks = [DataFrame({'id': [1, 2]}), DataFrame({'id': [3]})]
+    query.result.return_value.to_dataframe_iterable.return_value = chunks
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    read_sql_query = mocker.patch('mindlab.magics.awswrangler.redshift.read_sql_query')
+    unload = mocker.patch('mindlab.magics.awswrangler.redshift.unload')
+    delete_objects = mocker.patch('mindlab.magics.awswrangler.s3.delete_objects')
+    display = mocker.patch('mindlab.magics.display')
+    user_ns: dict[str, Any] = {}
+    magics.shell.user_ns = user_ns  # type: ignore[union-attr]
+    # Storing the results without keeping references to them (unlike a mocked method)
+    magics.shell.push = user_ns.update  # type: ignore[union-attr,method-assign]
+
+    # Test BigQuery
+    magics.bigquery(line='data --chunksize 2 --transpose --cache --info', cell='SELECT 1')
+    assert list(user_ns.pop('data')) == chunks
+    assert query.result.call_args.kwargs == {'page_size': 2}
+    assert 'chunks of up to 2 rows' in display.call_args.args[0].value
+    assert 'Local cache' not in display.call_args.args[0].value
+    magics.bigquery(line='data --chunksize 2 --arrow', cell='SELECT 1')
+    magics.bigquery(line='--chunksize 2', cell='SELECT 1')
+    assert capsys.readouterr().err == (
+        'Error: the --chunksize and --arrow arguments cannot be combined\n'
+        'Error: the output variable must be specified in chunk mode\n'
+    )
+
+    # Test Redshift (the connection is kept until all chunks have been read)
+    read_sql_query.return_value = iter(chunks)
+    magics.redshift(line='data --connection test --chunksize 2 --info', cell='SELECT 1')
+    assert read_sql_query.call_args.kwargs['chunksize'] == 2
+    assert not connect.return_value.rollback.called
+    assert magics._redshift_pool.status()[0].in_use == 1  # pylint: disable=protected-access
+    assert list(user_ns.pop('data')) == chunks
+    assert connect.return_value.rollback.called
+    assert magics._redshift_pool.status()[0].idle == 1  # pylint: disable=protected-access
+    read_sql_query.return_value = iter([])
+    magics.redshift(line='data --connection test --chunksize 2', cell='SELECT 1')
+    assert not list(user_ns.pop('data'))
+
+    # Test deleting unread Redshift chunks (the connection is returned to the pool)
+    read_sql_query.return_value = iter(chunks)
+    magics.redshift(line='data --connection test --chunksize 2', cell='SELECT 1')
+    assert magics._redshift_pool.status()[0].in_use == 1  # pylint: disable=protected-access
+    del user_ns['data']
+    assert magics._redshift_pool.status()[0].idle == 1  # pylint: disable=protected-access
+
+    # Test Redshift UNLOAD
+    unload.return_value = iter(chunks)
+    magics.redshift(line='data --connection test --chunksize 2 --unload', cell='SELECT 1')
+    assert unload.call_args.kwargs['chunked'] == 2
+    assert not delete_objects.called
+    assert list(user_ns.pop('data')) == chunks
+    assert delete_objects.call_args.kwargs['path'] == unload.call_args.kwargs['path']
+
+
+def test_bigquery_dry_run(
+    capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
+) -> None:
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    client = mocker.patch('mindlab.magics.bigquery.Client').return_value
+    query = client.query.return_value
+    query.total_bytes_processed = 2 * 10**12
+    query.referenced_tables = ['project.dataset.table']
+
+    assert magics.bigquery(line='--dry-run', cell='SELECT 1') is None
+    assert client.query.call_args.kwargs['job_config'].dry_run
+    assert capsys.readouterr().out == (
+        'Estimated data processed: 2.0 TB\n'
+        'Referenced tables:\n'
+        '- project.dataset.table\n'
+    )
+    mocker.patch.dict(mindlab_config, {'bigquery_max_bytes_billed': '1 TB'})
+    magics.bigquery(line='--dry-run', cell='SELECT 1')
+    assert 'Maximum bytes billed: 1.0 TB (exceeded)\n' in capsys.readouterr().out
+    magics.bigquery(line='--dry-run --max-bytes-billed 3TB', cell='SELECT 1')
+    assert 'Maximum bytes billed: 3.0 TB (within limit)\n' in capsys.readouterr().out
+
+    # Test budget enforcement (by BigQuery, without estimating the query first)
+    query.result.side_effect = BadRequest(  # type: ignore[no-untyped-call]
+        'Query exceeded limit for bytes billed',
+    )
+    assert magics.bigquery(line='', cell='SELECT 1') is None
+    assert capsys.readouterr().err == 'Error: 400 Query exceeded limit for bytes billed\n'
+    assert client.query.call_count == 4
+    assert client.query.call_args.kwargs['job_config'].maximum_bytes_billed == 10**12
+    query.result.side_effect = None
+    magics.bigquery(line='--max-bytes-billed 3TB', cell='SELECT 1')
+    assert client.query.call_count == 5
+    assert client.query.call_args.kwargs['job_config'].maximum_bytes_billed == 3 * 10**12
+
+    # Test invalid queries
+    client.query.side_effect = BadRequest('Test')  # type: ignore[no-untyped-call]
+    magics.bigquery(line='--dry-run', cell='SELECT')
+    assert capsys.readouterr().err == 'Error: 400 Test\n'
+
+
+def test_query_history(
+    capsys: CaptureFixture[str], mocker: MockerFixture, tmp_path: Path, magics: MindLabMagics,
+) -> None:
+    mocker.patch.dict(mindlab_config, {'cache_dir': str(tmp_path / 'cache'), 'history': True})
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    redshift_results(connect, DataFrame({'id': [1, 2, 3]}))
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    query = mocker.patch('mindlab.magics.bigquery.Client').return_value.query.return_value
+    query.total_bytes_processed = 1000
+    query.result.return_value.to_arrow.return_value = pyarrow.table({'id': [1]})
+    display = mocker.patch('mindlab.magics.display')
+
+    magics.query_history(line='')
+    assert capsys.readouterr().out == 'No queries have been recorded\n'
+
+    magics.redshift(line='--connection test --cache --info', cell='SELECT 1')
+    details = display.call_args.args[0].value
+    assert re.search(
+        r'Total time: <b>[\d,]+ ms \(auth: [\d,]+ ms, local cache: [\d,]+ ms, '
+        r'connection: [\d,]+ ms, execution \+ download: [\d,]+ ms, conversion: [\d,]+ ms\)</b>',
+        details,
+    )
+    magics.redshift(line='--connection test --cache', cell='SELECT 1')  # not recorded
+    magics.redshift(line='--connection test', cell='SELECT 2')
+    magics.bigquery(line='--info', cell='SELECT\n  3')
+    assert re.search(
+        r'\(auth: [\d,]+ ms, execution: [\d,]+ ms, download: [\d,]+ ms, conversion: [\d,]+ ms\)',
+        display.call_args.args[0].value,
+    )
+
+    entries = magics._query_history().entries()  # pylint: disable=protected-access
+    assert [(entry.magic, entry.rows, entry.bytes_processed) for entry in entries] == [
+        ('redshift', 3, None), ('redshift', 3, None), ('bigquery', 1, 1000),
+    ]
+    magics.query_history(line='--slowest 1')
+    assert re.fullmatch(
+        r'bigquery: 1 queries, p50: [\d,]+ ms, p95: [\d,]+ ms\n'
+        r'redshift: 2 queries, p50: [\d,]+ ms, p95: [\d,]+ ms\n'
+        r'Slowest queries:\n'
+        r'- [\d,]+ ms \((bigquery|redshift), \d{4}-\d\d-\d\d \d\d:\d\d; auth: .*\): SELECT \d\n',
+        capsys.readouterr().out,
+    )
+    magics.query_history(line='--magic bigquery')
+    assert capsys.readouterr().out.count('bigquery') == 2
+
+    # Test disabling and errors
+    mocker.patch.dict(mindlab_config, {'redshift_history': False})
+    magics.redshift(line='--connection test', cell='SELECT 2')
+    assert len(magics._query_history().entries()) == 3  # pylint: disable=protected-access
+    magics.query_history(line='--clear')
+    assert capsys.readouterr().out == 'The query history has been cleared\n'
+    mocker.patch.dict(mindlab_config, {'history_path': str(tmp_path)})  # a directory
+    magics.bigquery(line='', cell='SELECT 1')
+    assert capsys.readouterr().err.startswith('Warning: could not record the query')
+
+
+def test_compact(mocker: MockerFixture, magics: MindLabMagics) -> None:
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    read_sql_query = mocker.patch('mindlab.magics.awswrangler.redshift.read_sql_query')
+    data = DataFrame({'id': [1, 2, 3, 4], 'status': ['new', 'new', 'new', 'done']})
+    redshift_results(connect, data)
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    query = mocker.patch('mindlab.magics.bigquery.Client').return_value.query.return_value
+    query.result.return_value.to_arrow.return_value = pyarrow.table(data)
+    display = mocker.patch('mindlab.magics.display')
+
+    assert magics.redshift(line='--connection test', cell='SELECT 1')['id'].dtype == 'Int64'
+    actual = magics.redshift(line='--connection test --compact --info', cell='SELECT 1')
+    assert actual.dtypes.astype(str).to_list() == ['Int8', 'category']
+    assert re.search(
+        r'Memory usage: <b>[\d.]+ \w+ \(compacted from [\d.]+ \w+\)</b>',
+        display.call_args.args[0].value,
+    )
+    assert 'compaction: ' in display.call_args.args[0].value
+    mocker.patch.dict(mindlab_config, {'compact': True})
+    assert magics.bigquery(line='--info', cell='SELECT 1')['id'].dtype == 'Int8'
+    assert 'Memory usage' in display.call_args.args[0].value
+    assert magics.bigquery(line='--no-compact', cell='SELECT 1')['id'].dtype == 'Int64'
+
+    # Test chunks and Arrow tables
+    read_sql_query.return_value = iter([data, data])
+    magics.redshift(line='chunks --connection test --chunksize 4', cell='SELECT 1')
+    chunks = magics.shell.push.call_args.args[0]['chunks']  # type: ignore[union-attr]
+    assert [chunk['id'].dtype for chunk in chunks] == ['int8', 'int8']
+    mocker.patch('mindlab.magics.bigquery_storage.BigQueryReadClient')
+    table = pyarrow.table(data)
+    query.result.return_value.to_arrow_iterable.return_value = table.to_batches()
+    assert magics.bigquery(line='--arrow table', cell='SELECT 1').equals(table)
+
+
+def test_query_parameters(
+    capsys: CaptureFixture[str], mocker: MockerFixture, tmp_path: Path, magics: MindLabMagics,
+) -> None:
+    mocker.patch.dict(mindlab_config, {'cache_dir': str(tmp_path), 'cache': True})
+    magics.shell.user_ns = {'min_id': 1, 'ids': [1, 2]}  # type: ignore[union-attr]
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    cursor = redshift_results(connect, DataFrame({'id': [1, 2, 3]}))
+    read_sql_query = mocker.patch('mindlab.magics.awswrangler.redshift.read_sql_query')
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    client = mocker.patch('mindlab.magics.bigquery.Client').return_value
+    client.project = 'test'
+    client.query.return_value.total_bytes_processed = 100
+    client.query.return_value.result.return_value.to_arrow.return_value = pyarrow.table({})
+
+    # Test BigQuery
+    magics.bigquery(line='--max-bytes-billed 1GB', cell='SELECT @min_id, @ids')
+    assert client.query.call_args.args[0] == 'SELECT @min_id, @ids'
+    job_config = client.query.call_args.kwargs['job_config']
+    assert [parameter.name for parameter in job_config.query_parameters] == ['min_id', 'ids']
+    assert client.query.call_count == 1
+    magics.bigquery(line='', cell='SELECT @min_id, @ids')
+    assert client.query.call_count == 1  # cached
+    magics.shell.user_ns['min_id'] = 2  # type: ignore[union-attr]
+    magics.bigquery(line='--dry-run', cell='SELECT @min_id, @ids')
+    magics.bigquery(line='', cell='SELECT @min_id, @ids')
+    assert client.query.call_count == 3  # the cache key depends on the parameter values
+    magics.bigquery(line='', cell='SELECT @missing')
+    assert capsys.readouterr().err == 'Error: Query parameter "missing" is not defined\n'
+
+    # Test Redshift
+    magics.redshift(line='--connection test', cell="SELECT * FROM t WHERE id >= :min_id AND '%'")
+    assert cursor.execute.call_args.args == ("SELECT * FROM t WHERE id >= %s AND '%%'", [2])
+    magics.redshift(line='data --connection test --no-cache --chunksize 10', cell='SELECT :ids')
+    assert read_sql_query.call_args.kwargs['params'] == [[1, 2]]
+    magics.redshift(line='--connection test --unload', cell='SELECT :ids')
+    magics.redshift(line='--connection test', cell='SELECT :missing')
+    assert capsys.readouterr().err == (
+        'Error: query parameters cannot be used in UNLOAD mode\n'
+        'Error: Query parameter "missing" is not defined\n'
+    )
+    mocker.patch.dict(mindlab_config, {'redshift_unload_threshold': 1})
+    magics.redshift(line='--connection test --no-cache', cell='SELECT :min_id')
+    assert executed_queries(cursor)[-2:] == [  # no estimate
+        "SELECT * FROM t WHERE id >= %s AND '%%'", 'SELECT %s',
+    ]
+
+
+def test_incremental(
+    capsys: CaptureFixture[str], mocker: MockerFixture, magics: MindLabMagics,
+) -> None:
+    magics.shell.user_ns = {}  # type: ignore[union-attr]
+    magics.shell.push.side_effect = magics.shell.user_ns.update  # type: ignore[union-attr]
+    connect = mocker.patch('mindlab.magics.awswrangler.redshift.connect')
+    cursor = redshift_results(connect, DataFrame({'id': [1, 2], 'value': ['a', 'b']}))
+    mocker.patch.object(magics, '_gcp_auth').credentials.return_value.expired = False
+    client = mocker.patch('mindlab.magics.bigquery.Client').return_value
+    client.query.return_value.result.return_value.to_arrow.return_value = pyarrow.table(
+        {'id': [2, 3], 'value': ['b', 'c']},
+    )
+
+    # Test the initial full fetch
+    magics.redshift(line='data --connection test --incremental id', cell='SELECT * FROM t;')
+    assert cursor.execute.call_args.args[0] == 'SELECT * FROM t;'
+    assert list(magics.shell.user_ns['data']['id']) == [1, 2]  # type: ignore[union-attr]
+
+    # Test incremental fetches
+    magics.bigquery(line='data --incremental id', cell='SELECT * FROM t;')
+    assert client.query.call_args.args[0] == (
+        'SELECT * FROM (\nSELECT * FROM t\n) AS incremental '
+        'WHERE `id` >= @mindlab_incremental_max'
+    )
+    job_config = client.query.call_args.kwargs['job_config']
+    assert job_config.query_parameters[0].value == 2
+    data = magics.shell.user_ns['data']  # type: ignore[union-attr]
+    assert data.to_dict('list') == {'id': [1, 2, 3], 'value': ['a', 'b', 'c']}
+    redshift_results(connect, DataFrame({'id': [3, 4], 'value': ['c', 'd']}))
+    query = magics.redshift(
+        line='data --connection test --incremental id --background', cell='SELECT * FROM t',
+    )
+    query.result(timeout=10)
+    assert cursor.execute.call_args.args == (
+        'SELECT * FROM (\nSELECT * FROM t\n) AS incremental WHERE "id" >= %s', [3],
+    )
+    assert list(magics.shell.user_ns['data']['id']) == [1, 2, 3, 4]  # type: ignore[union-attr]
+
+    # Test duplicate rows and array and struct values
+    magics.shell.user_ns['data'] = DataFrame({  # type: ignore[union-attr]
+        'id': [1, 1, 2], 'tags': [['a'], ['a'], ['b']], 'user': [{'id': None}] * 3,
+    })
+    client.query.return_value.result.return_value.to_arrow.return_value = pyarrow.table(
+        {'id': [2, 2, 3], 'tags': [['b'], ['b'], ['c']], 'user': [{'id': None}] * 3},
+    )
+    magics.bigquery(line='data --incremental id', cell='SELECT * FROM t')
+    data = magics.shell.user_ns['data']  # type: ignore[union-attr]
+    assert data['id'].to_list() == [1, 1, 2, 2, 3]
+    assert [list(tags) for tags in data['tags']] == [['a'], ['a'], ['b'], ['b'], ['c']]
+
+    # Test missing maximum values
+    magics.shell.user_ns['data'] = DataFrame({'id': [None]})  # type: ignore[union-attr]
+    magics.redshift(line='data --connection test --incremental id', cell='SELECT * FROM t')
+    assert cursor.execute.call_args.args[0] == 'SELECT * FROM t'
+
+    # Test invalid options
+    magics.redshift(line='--connection test --incremental id', cell='SELECT 1')
+    magics.redshift(line='data --connection test --incremental id --chunksize 1', cell='SELECT 1')
+    magics.bigquery(line='data --incremental id --arrow table', cell='SELECT 1')
+    magics.bigquery(line='data --incremental id-1', cell='SELECT 1')
+    magics.bigquery(line='data --incremental missing', cell='SELECT 1')
+    assert capsys.readouterr().err == (
+        'Error: the output variable must be specified in incremental mode\n'
+        'Error: incremental mode only supports data frame results\n'
+        'Error: incremental mode only supports data frame results\n'
+        'Error: invalid incremental column "id-1"\n'
+        'Error: column "missing" not found in "data"\n'
+    )
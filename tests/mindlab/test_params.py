@@ -0,0 +1,66 @@
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+
+import numpy as np
+from google.cloud.bigquery import ArrayQueryParameter, ScalarQueryParameter
+from pandas import Series, Timestamp
+from pytest import raises
+
+from mindlab.params import bigquery_parameters, find_parameters, redshift_parameters
+
+
+def test_find_parameters() -> None:
+    sql = (
+        "SELECT @first, '@string', \"@quoted\", `@table`, @@system, email@domain, @second -- @c\n"
+        "FROM test /* @comment\n */ WHERE x = @first AND y = 'it''s @escaped'"
+    )
+    assert find_parameters(sql, prefix='@') == ['first', 'second']
+    assert find_parameters('SELECT :a::int, b::text, \'12:30\', :_b2', prefix=':') == ['a', '_b2']
+
+
+def test_bigquery_parameters() -> None:
+    namespace = {
+        'flag': np.bool_(True), 'count': np.int64(3), 'ratio': 0.5, 'amount': Decimal('1.5'),
+        'name': 'test', 'data': b'\x00', 'day': date(2020, 1, 1), 'moment': time(12, 30),
+        'local': datetime(2020, 1, 1, 12), 'utc': Timestamp('2020-01-01 12:00', tz='UTC'),
+        'ids': Series([1, 2]), 'names': ('a', 'b'),
+    }
+    sql = 'SELECT ' + ', '.join(f'@{name}' for name in namespace)
+    assert bigquery_parameters(sql, namespace) == [
+        ScalarQueryParameter('flag', 'BOOL', True),
+        ScalarQueryParameter('count', 'INT64', 3),
+        ScalarQueryParameter('ratio', 'FLOAT64', 0.5),
+        ScalarQueryParameter('amount', 'NUMERIC', Decimal('1.5')),
+        ScalarQueryParameter('name', 'STRING', 'test'),
+        ScalarQueryParameter('data', 'BYTES', b'\x00'),  # type: ignore[arg-type]
+        ScalarQueryParameter('day', 'DATE', date(2020, 1, 1)),
+        ScalarQueryParameter('moment', 'TIME', time(12, 30)),  # type: ignore[arg-type]
+        ScalarQueryParameter('local', 'DATETIME', datetime(2020, 1, 1, 12)),
+        ScalarQueryParameter('utc', 'TIMESTAMP', datetime(2020, 1, 1, 12, tzinfo=timezone.utc)),
+        ArrayQueryParameter('ids', 'INT64', [1, 2]),
+        ArrayQueryParameter('names', 'STRING', ['a', 'b']),
+    ]
+    assert not bigquery_parameters('SELECT 1', {})
+
+    with raises(ValueError, match='"missing" is not defined'):
+        bigquery_parameters('SELECT @missing', {})
+    with raises(ValueError, match='Cannot determine the type of empty'):
+        bigquery_parameters('SELECT @empty', {'empty': []})
+    with raises(ValueError, match='Cannot determine the type of query parameter "none"'):
+        bigquery_parameters('SELECT @none', {'none': None})
+    with raises(ValueError, match='unsupported type'):
+        bigquery_parameters('SELECT @value', {'value': object()})
+
+
+def test_redshift_parameters() -> None:
+    namespace = {'id': np.int64(1), 'day': date(2020, 1, 1)}
+    assert redshift_parameters(
+        "SELECT :id::int, '50%' AS ':day', x LIKE 'a%' /* :x */ FROM t WHERE d = :day OR i = :id",
+        namespace,
+    ) == (
+        "SELECT %s::int, '50%%' AS ':day', x LIKE 'a%%' /* :x */ FROM t WHERE d = %s OR i = %s",
+        [1, date(2020, 1, 1), 1],
+    )
+    assert redshift_parameters("SELECT '50%'", {}) == ("SELECT '50%'", [])
+    with raises(ValueError, match='"missing" is not defined'):
+        redshift_parameters('SELECT :missing', {})
@@ -1,16 +1,42 @@
+import json
+import os
+import pickle  # nosec: only used for pickling figures
+import subprocess  # nosec: used for saving figures from a fresh interpreter
+import sys
+from collections.abc import Callable
+from io import BytesIO
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
 
+import matplotlib
+import numpy as np
+from IPython.core.formatters import DisplayFormatter
+from IPython.core.pylabtools import select_figure_formats
 from matplotlib import pyplot
+from matplotlib.backends.backend_agg import RendererAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.colors import to_hex, to_rgba_array
+from matplotlib.patheffects import withStroke
 from numpy.random import Generator
-from pandas import DataFrame, Series
-from pytest import raises
+from pandas import DataFrame, Series, date_range
+from pytest import raises, warns
 from pytest_mock import MockerFixture
 
-from mindlab import Figure, mock_data
-from mindlab.plot import use_mindlab_styles
+import mindlab
+from mindlab import Figure, mock_data, plot
+from mindlab.plot import FONT_MANIFEST, LineDecimation, install_fonts, save_all, use_mindlab_styles
 from tests.mindlab.conftest import CheckFigure
 
 
+def test_package_attributes() -> None:
+    assert mindlab.use_mindlab_styles is use_mindlab_styles
+    assert mindlab.save_all is save_all
+    with raises(AttributeError, match='has no attribute'):
+        assert mindlab.missing
+
+
 def test_use_mindlab_styles_refresh_fonts(mocker: MockerFixture, tmp_path: Path) -> None:
     add_font = mocker.patch('mindlab.plot.matplotlib.font_manager.fontManager.addfont')
     assert use_mindlab_styles(font_install_path=tmp_path / 'fonts')
@@ -26,6 +52,25 @@ def test_use_mindlab_styles_disable() -> None:
     assert not use_mindlab_styles(apply_mindlab_styles=False)
 
 
+def test_install_fonts(mocker: MockerFixture, tmp_path: Path) -> None:
+    copy_folder = mocker.spy(plot, 'copy_folder')
+    font_files = install_fonts(target_dir=tmp_path)
+    assert all(font_file.exists() for font_file in font_files)
+    assert install_fonts(target_dir=tmp_path) == font_files
+    assert copy_folder.call_count == 1  # up to date
+
+    font_files[0].unlink()
+    assert install_fonts(target_dir=tmp_path) == font_files
+    assert font_files[0].exists()
+    manifest_path = tmp_path / FONT_MANIFEST
+    manifest = json.loads(manifest_path.read_text())
+    manifest_path.write_text(json.dumps({**manifest, 'stamp': 'outdated'}))
+    install_fonts(target_dir=tmp_path)
+    manifest_path.write_text('invalid')
+    install_fonts(target_dir=tmp_path)
+    assert copy_folder.call_count == 4
+
+
 def test_invalid_tics() -> None:
     with raises(ValueError, match='tics setting'):
         Figure(xtics='invalid')
@@ -55,6 +100,47 @@ def test_time_series(check_figure: CheckFigure) -> None:
     check_figure(figure, 'time_series_day.png')
 
 
+def test_line_decimation(generator: Generator, mocker: MockerFixture) -> None:
+    data = Series(generator.normal(size=100_000).cumsum())
+    data[50_000], data[60_000] = 1000, -1000
+    data[70_000:70_100] = np.nan
+    figure = Figure()
+    figure.line(data)
+    draw_path = mocker.spy(RendererAgg, 'draw_path')
+
+    def drawn_points(**kwargs: Any) -> np.ndarray[Any, Any]:
+        draw_path.reset_mock()
+        figure.save(BytesIO(), format='png', **kwargs)
+        return max((call.args[2].vertices for call in draw_path.call_args_list), key=len)
+
+    points = drawn_points()
+    assert len(points) < 20_000
+    assert (np.nanmax(points[:, 1]), np.nanmin(points[:, 1])) == (1000, -1000)  # peaks are kept
+    assert (points[0, 0], points[-1, 0]) == (0, 99_999)
+    assert np.isnan(points[:, 1]).any()  # gaps are kept
+    assert len(figure.lines[0].get_xdata()) == 100_000  # the data is not changed
+    assert len(drawn_points(dpi=100)) < len(points) < len(drawn_points(dpi=600))
+    figure.figure.set_figwidth(2 * figure.figure.get_figwidth())
+    assert len(drawn_points()) > len(points)
+
+    figure.set_xlim(49_990, 50_010)
+    assert list(drawn_points()[:, 0]) == list(range(49_989, 50_012))  # all visible points
+    figure.set_xscale('log')
+    figure.set_xlim(1, 100_000)
+    assert len(drawn_points()) < 20_000
+
+
+def test_line_decimation_skipped(generator: Generator) -> None:
+    figure = Figure()
+    figure.line(generator.normal(size=20_000), marker='o')
+    figure.line(generator.random(1000))
+    figure.line(generator.random(20_000), path_effects=[withStroke(linewidth=3)])
+    assert not any(isinstance(effect, LineDecimation) for line in figure.lines
+                   for effect in line.get_path_effects())
+    vertices = np.column_stack([np.repeat(np.arange(10), 2), np.tile([0, 1], 10)])
+    assert len(LineDecimation.decimated_indices(vertices[:, 0], vertices[:, 1])) == 20
+
+
 def test_log_plot(check_figure: CheckFigure) -> None:
     figure = Figure(xscale='log', yscale='log')
     figure.scatter([1e0, 1e1, 1e2, 1e3, 1e4], [1e-2, 1e-1, 1e0, 1e1, 1e2])
@@ -82,6 +168,104 @@ def test_scatter_plot_colors(generator: Generator, check_figure: CheckFigure) ->
     check_figure(figure, 'scatter_plot_colors.png')
 
 
+def test_batched_lines(mocker: MockerFixture) -> None:
+    mocker.patch('mindlab.plot.GROUP_BATCH_THRESHOLD', 1)
+    mocker.patch('mindlab.plot.LEGEND_GROUPS', 2)
+    data = DataFrame(
+        index=date_range('2024-01-01', periods=3).repeat(3),
+        data={'y': range(9), 'group': ['a', 'b', None, 'a', 'b', 'c', 'a', 'b', 'c']},
+    )
+    figure = Figure()
+    figure.line(data.groupby('group'), marker='o', linewidth=2)
+    collections = [item for item in figure.collections if isinstance(item, LineCollection)]
+    assert len(collections) == 1
+    assert [len(segment) for segment in collections[0].get_segments()] == [3, 3, 2]
+    assert [line.get_label() for line in figure.lines] == ['a', 'b']  # largest groups
+    assert figure.get_ylim()[1] >= 8
+
+    # Test legend colors
+    cases: list[tuple[dict[str, Any], list[str]]] = [
+        ({}, [to_hex(color) for color in to_rgba_array(collections[0].get_colors())[:2]]),
+        ({'color': 'red'}, ['#ff0000', '#ff0000']),
+        ({'colors': ['red', 'blue']}, ['#ff0000', '#0000ff']),
+    ]
+    for kwargs, legend_colors in cases:
+        figure = Figure()
+        figure.line(data.groupby('group'), **kwargs)
+        assert [to_hex(line.get_color()) for line in figure.lines] == legend_colors
+
+
+def test_batched_scatter(generator: Generator, mocker: MockerFixture) -> None:
+    mocker.patch('mindlab.plot.GROUP_BATCH_THRESHOLD', 1)
+    data = DataFrame({
+        'x': generator.random(100),
+        'y': generator.random(100),
+        'z': 25 * [1] + 25 * [2] + 25 * [3] + 25 * [4],
+    })
+    cases: list[tuple[dict[str, Any], int]] = [
+        ({'cmap': 'viridis'}, 4), ({}, 4), ({'color': 'red'}, 1), ({'c': data['z']}, 4),
+    ]
+    for kwargs, point_colors in cases:
+        figure = Figure()
+        figure.scatter(data.groupby('z'), **kwargs)
+        points, *proxies = [
+            item for item in figure.collections if isinstance(item, PathCollection)
+        ]
+        assert len(np.asarray(points.get_offsets())) == 100
+        assert len(np.unique(np.asarray(points.get_edgecolor()), axis=0)) == point_colors
+        assert [proxy.get_label() for proxy in proxies] == ['1', '2', '3', '4']
+        drawn_colors = {to_hex(color) for color in to_rgba_array(points.get_edgecolor())}
+        proxy_colors = {to_hex(to_rgba_array(proxy.get_edgecolor())[0]) for proxy in proxies}
+        assert proxy_colors <= drawn_colors
+
+
+def test_scatter_aggregate(generator: Generator, mocker: MockerFixture) -> None:
+    x, y = generator.random(1000), generator.random(1000)
+    figure = Figure()
+    figure.scatter(x, y, aggregate='count')
+    image = figure.images[0]
+    assert image.get_array().sum() == 1000
+    assert len(figure.figure.axes) == 2  # colorbar
+
+    figure = Figure(xlim=(0, 2), ylim=(0, 2))
+    figure.scatter(x=x, y=y, c=np.ones(1000), aggregate='sum', alpha=0.5)
+    assert figure.images[0].get_array().sum() == 1000
+    assert list(figure.images[0].get_extent()) == [0, 2, 0, 2]
+
+    mocker.patch('mindlab.plot.AGGREGATE_THRESHOLD', 100)
+    figure = Figure()
+    figure.scatter(x, y, c=np.full(1000, 3), cmap='viridis')
+    assert set(figure.images[0].get_array().compressed()) == {3}  # mean
+    figure = Figure(xscale='log')
+    figure.scatter(x, y)
+    assert not figure.images
+
+
+def test_scatter_aggregate_options(generator: Generator) -> None:
+    x, y = generator.random(1000), generator.random(1000)
+    figure = Figure(legend='upper left')
+    figure.scatter(x, y, aggregate='count', label='Points', marker='s', s=5)
+    proxy = figure.collections[-1]
+    assert proxy.get_label() == 'Points'
+    assert list(proxy.get_sizes()) == [5]
+    assert figure.get_legend_handles_labels()[1] == ['Points']
+    with warns(UserWarning, match='ignore the arguments marker, zorder'):
+        Figure().scatter(x, y, aggregate='count', marker='s', zorder=3)
+
+
+def test_scatter_aggregate_errors(generator: Generator) -> None:
+    x, y = generator.random(10), generator.random(10)
+    with raises(ValueError, match='Invalid aggregate'):
+        Figure().scatter(x, y, aggregate='invalid')
+    with raises(ValueError, match='requires color values'):
+        Figure().scatter(x, y, aggregate='mean')
+    with raises(ValueError, match='linear scales'):
+        Figure(yscale='log').scatter(x, y, aggregate='count')
+    with raises(ValueError, match='cannot be aggregated'):
+        data = DataFrame({'x': x, 'y': y, 'z': 10 * [1]})
+        Figure().scatter(data.groupby('z'), aggregate='count')
+
+
 def test_stacked_bar(check_figure: CheckFigure) -> None:
     data = DataFrame(
         index=[1, 2, 3, 1, 3, 5],
@@ -92,6 +276,33 @@ def test_stacked_bar(check_figure: CheckFigure) -> None:
     check_figure(figure, 'stacked_bar.png')
 
 
+def test_stacked_bar_paths(mocker: MockerFixture, check_figure: CheckFigure) -> None:
+    mocker.patch('mindlab.plot.BAR_PATH_THRESHOLD', 0)
+    data = DataFrame(
+        index=[1, 2, 3, 1, 3, 5],
+        data={'y': [1, 1, 1, 1, 3, 2], 'group': ['a', 'a', 'a', 'b', 'b', 'c']},
+    )
+    figure = Figure(xlabel='Sets', ylabel='Values', title='Title')
+    figure.bar(data.groupby('group'))
+    assert len(figure.patches) == 3  # one path per group
+    check_figure(figure, 'stacked_bar.png')
+
+
+def test_stacked_bar_paths_options(mocker: MockerFixture) -> None:
+    mocker.patch('mindlab.plot.BAR_PATH_THRESHOLD', 0)
+    data = DataFrame(
+        index=date_range('2024-01-01', periods=2).repeat(2),
+        data={'y': [1, 2, 3, 4], 'group': ['a', 'b', 'a', 'b']},
+    )
+    with matplotlib.rc_context({'patch.force_edgecolor': True}):
+        figure = Figure()
+        figure.bar(data.groupby('group'), color='red', align='edge', width=0.5)
+    assert [patch.get_label() for patch in figure.patches] == ['a', 'b']
+    assert figure.patches[1].get_facecolor() == (1, 0, 0, 1)
+    bottom, top = figure.get_ylim()
+    assert (bottom, top >= 6) == (0, True)
+
+
 def test_stacked_bar_errors() -> None:
     with raises(ValueError, match='negative y'):
         Figure().bar(DataFrame(index=[1], data={'y': [-1], 'group': ['a']}).groupby('group'))
@@ -103,6 +314,28 @@ def test_kde(check_figure: CheckFigure) -> None:
     check_figure(figure, 'kde.png')
 
 
+def test_kde_rug(mocker: MockerFixture) -> None:
+    mocker.patch('mindlab.plot.RUG_THRESHOLD', 0)
+    figure = Figure()
+    figure.kde(Series([-10, 0, 5, 5, 5.001, 6, 10]))
+    assert list(figure.lines[1].get_xdata()) == [-10, 0, 5, 6, 10]  # one tick per pixel
+
+
+def test_kde_binned_options(generator: Generator) -> None:
+    data = Series(generator.normal(size=20_000))
+    options: list[dict[str, Any]] = [
+        {}, {'bw_method': 0.2, 'ind': 100}, {'bw_method': 'silverman', 'ind': [0, 10]},
+    ]
+    for kwargs in options:
+        figure = Figure()
+        figure.kde(data, rug=False, **kwargs)
+        expected = figure.lines[0].get_ydata()
+        figure = Figure()
+        figure.kde(data, rug=False, weights=np.ones(len(data)), **kwargs)  # exact estimate
+        assert np.allclose(figure.lines[0].get_ydata(), expected, atol=1e-4)
+    assert figure.get_ylabel() == 'Density'
+
+
 def test_colors(check_figure: CheckFigure) -> None:
     x_data = [1, 2, 3, 4, 5]
     y_data = [2, 3, 5, 2, 3]
@@ -116,3 +349,175 @@ def test_colors(check_figure: CheckFigure) -> None:
             for color in range(0, 10):
                 figure.plot(x_data, [15 - value - color for value in y_data], label=f'C{color}')
             check_figure(figure, f'colors_{scheme}.png')
+
+
+def test_render_cache(mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.dict(os.environ, {'MINDLAB_RENDER_CACHE_DIR': str(tmp_path)})
+    render = mocker.spy(Figure, '_render')
+    data = Series(range(10), index=date_range('2024-01-01', periods=10))
+
+    def figure(title: str = 'Title') -> Figure:
+        figure = Figure(title=title, xtics='day')
+        figure.line(data, label='Data')
+        return figure
+
+    assert figure().as_bytes() == figure().as_bytes()  # not cached by default
+    assert not list(tmp_path.iterdir())
+    image = figure().as_bytes(cache=True)
+    assert figure().as_bytes(cache=True) == image
+    assert render.call_count == 3
+    assert len(list(tmp_path.iterdir())) == 1
+
+    figure(title='Other').as_bytes(cache=True)
+    with pyplot.style.context('mindlab.styles.mindlab_dark'):
+        figure().as_bytes(cache=True)
+    assert render.call_count == 5
+
+    mocker.patch.dict(os.environ, {'MINDLAB_RENDER_CACHE': 'true'})
+    uncachable = figure()
+    uncachable.xaxis.set_major_formatter(lambda x, _: str(x))
+    uncachable.as_bytes()
+    uncachable.as_bytes()
+    assert render.call_count == 7
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_draw_count() -> None:
+    data = Series(range(60), index=date_range('2024-01-01', periods=60))
+    figure = Figure(xtics='week')
+    figure.line(data, label='Data')
+    draw_counts = [figure.draw_count]
+    figure.as_bytes()
+    draw_counts.append(figure.draw_count)
+    legend = figure.get_legend()
+    figure.save(BytesIO(), format='svg')
+    draw_counts.append(figure.draw_count)
+    assert figure.get_legend() is legend  # not recreated
+    assert {label.get_rotation() for label in figure.xaxis.get_majorticklabels()} == {30}
+
+    figure.line(data + 1, label='Other')
+    figure.as_bytes()
+    draw_counts.append(figure.draw_count)
+    assert draw_counts == [0, 1, 2, 3]
+    assert [text.get_text() for text in figure.get_legend().get_texts()] == ['Data', 'Other']
+
+    # Test tight bounding boxes and layout engines
+    layout_engine = figure.figure.get_layout_engine()
+    figure.save(BytesIO(), format='pdf', bbox_inches='tight')
+    figure.save(BytesIO(), format='png', bbox_inches='tight', pad_inches=0, dpi='figure')
+    figure.save(BytesIO(), format='png', dpi=None)
+    assert figure.draw_count == 6
+    assert figure.figure.get_layout_engine() is layout_engine
+    figure.figure.draw_without_rendering()
+    assert figure.draw_count == 6
+    figure = Figure()
+    with matplotlib.rc_context({'figure.constrained_layout.use': False}):
+        figure.figure.set_layout_engine(None)
+        figure.as_bytes()
+    assert figure.draw_count == 1
+
+
+def test_draw_count_ipython() -> None:
+    shell = SimpleNamespace(display_formatter=DisplayFormatter())
+    select_figure_formats(shell, {'png', 'svg'})
+    figure = Figure(xtics='day')
+    figure.line(Series(range(30), index=date_range('2024-01-01', periods=30)), label='Data')
+    data, _ = shell.display_formatter.format(figure.figure)
+    assert {'image/png', 'image/svg+xml'} <= set(data)
+    assert figure.draw_count == 2  # one for each format
+    assert figure.get_legend() is not None
+
+
+def time_series_figure(days: int = 60) -> Figure:
+    figure = Figure(ylabel='Values', title='Title', xtics='week')
+    figure.line(mock_data.stock_prices(days=days))
+    return figure
+
+
+def test_pickle(check_figure: CheckFigure) -> None:
+    figure = pickle.loads(pickle.dumps(time_series_figure()))  # nosec: trusted data
+    check_figure(figure, 'time_series_week.png')
+    assert not hasattr(Figure.__new__(Figure), 'lines')  # no infinite recursion
+
+    data = Series(range(20_000), index=date_range('2024-01-01', periods=20_000, freq='min'))
+    figure = Figure(legend=None, xtics='day')
+    figure.line(data)
+    figure = pickle.loads(pickle.dumps(figure))  # nosec: trusted data
+    assert isinstance(figure.lines[0].get_path_effects()[0], LineDecimation)
+    figure.as_bytes()
+    assert figure.get_xticklabels()[0].get_rotation() == 30
+
+
+def test_save_rasterize(generator: Generator, mocker: MockerFixture, tmp_path: Path) -> None:
+    figure = Figure(title='Title')
+    figure.scatter(generator.random(20_000), generator.random(20_000), label='Points')
+    figure.line(Series(generator.random(100)), label='Line')
+
+    info = figure.save(path := tmp_path / 'figure.svg')
+    assert (info.format, info.size, info.rasterized) == ('svg', path.stat().st_size, 1)
+    assert info.seconds > 0
+    assert path.read_text().count('<image') == 1
+    assert '<!-- Title -->' in path.read_text()  # text is kept as vectors
+    assert not any(artist.get_rasterized() for artist in [*figure.lines, *figure.collections])
+    assert figure.draw_count == 1  # the layout pass does not rasterize
+
+    assert not figure.save(path, rasterize_threshold=0).rasterized
+    assert '<image' not in path.read_text()
+    line_figure = Figure()
+    line_figure.line(generator.normal(size=100_000).cumsum())
+    assert not line_figure.save(path).rasterized  # decimated lines are drawn with few points
+    mocker.patch.dict(os.environ, {'MINDLAB_RASTERIZE_THRESHOLD': '50'})
+    assert figure.save(path).rasterized == 2
+
+    output = BytesIO(b'header')
+    output.seek(0, os.SEEK_END)
+    info = figure.save(output, format='png')
+    assert (info.format, info.size, info.rasterized) == ('png', len(output.getvalue()) - 6, 0)
+    with PdfPages(tmp_path / 'figures.pdf') as document:
+        assert figure.save(document, format='pdf').size is None
+
+
+def test_save_all(tmp_path: Path) -> None:
+    outputs = [tmp_path / 'figure.png', tmp_path / 'figure.svg', tmp_path / 'figure.pdf']
+    figures: list[Figure | Callable[[], Figure]] = [
+        time_series_figure(), time_series_figure, time_series_figure,
+    ]
+    assert save_all(figures, outputs, workers=2) == outputs
+    assert outputs[0].read_bytes().startswith(b'\x89PNG')
+    assert b'<svg' in outputs[1].read_bytes()
+    assert outputs[2].read_bytes().startswith(b'%PDF')
+
+    assert save_all(figures[:1], [tmp_path / 'single.png']) == [tmp_path / 'single.png']
+    output = tmp_path / 'figures.pdf'
+    assert save_all(figures, str(output), workers=1) == [output]
+    assert b'/Count 3' in output.read_bytes()  # one page per figure
+
+
+def test_save_all_params(tmp_path: Path) -> None:
+    outputs = [str(tmp_path / 'a.svg'), str(tmp_path / 'b.svg')]
+    code = '\n'.join([
+        'import matplotlib',
+        'from mindlab import save_all',
+        'from tests.mindlab.test_plot import time_series_figure',
+        "matplotlib.rcParams.update({'figure.facecolor': '#fedcba', 'lines.linewidth': 5.5})",
+        "if __name__ == '__main__':",
+        f'    save_all([time_series_figure] * 2, {outputs!r}, workers=2)',
+    ])
+    subprocess.run(  # nosec: the code is trusted
+        [sys.executable, '-c', code], cwd=Path(__file__).parents[2], check=True,
+    )
+    for output in outputs:
+        svg = Path(output).read_text(encoding='utf-8')
+        assert 'fill: #fedcba' in svg
+        assert 'stroke-width: 5.5' in svg
+
+    with matplotlib.rc_context():  # the worker initializer is only run in the subprocesses above
+        plot._use_params({'lines.linewidth': 5.5})  # pylint: disable=protected-access
+        assert matplotlib.rcParams['lines.linewidth'] == 5.5
+
+
+def test_save_all_errors(tmp_path: Path) -> None:
+    with raises(ValueError, match='single file in PDF format'):
+        save_all([time_series_figure], tmp_path / 'figures.png')
+    with raises(ValueError, match='Expected 1 output paths'):
+        save_all([time_series_figure], [tmp_path / 'a.png', tmp_path / 'b.png'])
@@ -0,0 +1,85 @@
+from pytest import raises
+from pytest_mock import MockerFixture
+
+from mindlab.pool import ConnectionPool, PoolStatus
+
+
+def test_connection_reuse(mocker: MockerFixture) -> None:
+    connect = mocker.MagicMock()
+    pool = ConnectionPool()
+    with pool.connection('key', connect) as connection:
+        assert pool.status() == [PoolStatus(key='key', idle=0, in_use=1)]
+    assert connection.rollback.call_count == 1  # the transaction is ended upon release
+    with pool.connection('key', connect) as reused_connection:
+        assert reused_connection is connection
+    with pool.connection('other', connect):
+        pass
+    assert connect.call_count == 2
+    assert pool.status() == [
+        PoolStatus(key='key', idle=1, in_use=0),
+        PoolStatus(key='other', idle=1, in_use=0),
+    ]
+
+
+def test_connection_liveness(mocker: MockerFixture) -> None:
+    connect = mocker.MagicMock()
+    pool = ConnectionPool()
+    with pool.connection('key', connect) as connection:
+        connection.cursor.side_effect = ConnectionError
+    with pool.connection('key', connect):
+        pass
+    assert connect.call_count == 2
+    assert connection.close.called
+
+
+def test_connection_error(mocker: MockerFixture) -> None:
+    connect = mocker.MagicMock()
+    pool = ConnectionPool()
+    with raises(ValueError), pool.connection('key', connect):
+        raise ValueError('Query error')
+    assert connect.return_value.rollback.called
+    assert pool.status() == [PoolStatus(key='key', idle=1, in_use=0)]
+
+    connect.return_value.rollback.side_effect = ConnectionError
+    with raises(ValueError), pool.connection('key', connect):
+        raise ValueError('Connection error')
+    assert connect.return_value.close.called
+    assert not pool.status()
+
+    connect.side_effect = ConnectionError
+    with raises(ConnectionError), pool.connection('key', connect):
+        pass  # pragma: no cover
+    assert not pool.status()
+
+
+def test_idle_timeout(mocker: MockerFixture) -> None:
+    monotonic = mocker.patch('mindlab.pool.time.monotonic', return_value=0)
+    connect = mocker.MagicMock()
+    pool = ConnectionPool(idle_timeout=60)
+    with pool.connection('key', connect):
+        pass
+    monotonic.return_value = 61
+    assert not pool.status()
+    assert connect.return_value.close.called
+
+
+def test_max_connections(mocker: MockerFixture) -> None:
+    pool = ConnectionPool(max_connections=1, wait_timeout=0)
+    with pool.connection('key', mocker.MagicMock()) as connection:
+        with raises(RuntimeError, match='in use'), pool.connection('other', mocker.MagicMock()):
+            pass  # pragma: no cover
+    with pool.connection('other', mocker.MagicMock()):
+        assert connection.close.called  # the least recently used connection is closed
+    assert pool.status() == [PoolStatus(key='other', idle=1, in_use=0)]
+
+
+def test_reset(mocker: MockerFixture) -> None:
+    pool = ConnectionPool()
+    with pool.connection('idle', mocker.MagicMock()) as idle_connection:
+        pass
+    with pool.connection('in_use', mocker.MagicMock()) as in_use_connection:
+        pool.reset()
+        assert idle_connection.close.called
+        assert not in_use_connection.close.called
+    assert in_use_connection.close.called
+    assert not pool.status()
@@ -1,9 +1,18 @@
+import importlib
+import re
+import sys
 from os import environ
+from pathlib import Path
 
+import pyarrow
+from pandas import ArrowDtype, DataFrame, Series
 from pytest import raises
 from pytest_mock import MockerFixture
 
-from mindlab.utils import get_config, mindlab_config
+from mindlab.utils import (
+    LazyModule, PhaseTimer, call_on_import, compact_data_frame,
+    get_config, mindlab_config, parse_size,
+)
 
 
 def test_get_config(mocker: MockerFixture) -> None:
@@ -19,3 +28,110 @@ def test_get_config(mocker: MockerFixture) -> None:
     assert get_config('non_existent', 'test') == 'test'
     with raises(ValueError):
         get_config('non_existent', required=True)
+
+
+def test_get_config_value_type(mocker: MockerFixture) -> None:
+    env = {'MINDLAB_ENABLED': 'true', 'MINDLAB_DISABLED': 'no', 'MINDLAB_COUNT': '3'}
+    mocker.patch.dict(mindlab_config, {'items': 'a,b', 'list_items': ['c']}, clear=True)
+    mocker.patch.dict(environ, env, clear=True)
+
+    assert get_config('enabled', value_type=bool) is True
+    assert get_config('disabled', value_type=bool) is False
+    assert get_config('non_existent', value_type=bool) is None
+    assert get_config('count', value_type=int) == 3
+    assert get_config('items', value_type=list) == ['a', 'b']
+    assert get_config('list_items', value_type=list) == ['c']
+    assert get_config('non_existent', value_type=list) == []
+
+
+def test_lazy_module() -> None:
+    lazy_re = LazyModule('re')
+    assert repr(lazy_re) == '<Lazy module re>'
+    assert lazy_re.fullmatch is re.fullmatch
+    lazy_re.fullmatch = None  # type: ignore[attr-defined] # only affects the lazy module
+    assert re.fullmatch is not None
+    with raises(AttributeError):
+        assert lazy_re.missing
+
+
+def test_call_on_import(mocker: MockerFixture, tmp_path: Path) -> None:
+    for name in ['mindlab_test_hooked', 'mindlab_test_other']:
+        (tmp_path / f'{name}.py').write_text('VALUE = 42\n', encoding='utf-8')
+    mocker.patch.object(sys, 'path', [str(tmp_path), *sys.path])
+    mocker.patch.object(sys, 'meta_path', list(sys.meta_path))
+    mocker.patch.dict(sys.modules)
+    values = []
+
+    def callback() -> None:
+        values.append(sys.modules['mindlab_test_hooked'].VALUE)
+
+    call_on_import('mindlab_test_hooked', callback)
+    importlib.import_module('mindlab_test_other')
+    assert not values
+    module = importlib.import_module('mindlab_test_hooked')
+    assert values == [42]
+    assert module.__spec__ and module.__loader__ is module.__spec__.loader
+    assert module.__loader__.__class__.__name__ == 'SourceFileLoader'
+    importlib.reload(module)
+    assert values == [42]  # only called once
+    call_on_import('mindlab_test_hooked', callback)  # already imported
+    assert values == [42, 42]
+
+    # Test missing modules
+    call_on_import('mindlab_test_missing', callback)
+    with raises(ModuleNotFoundError):
+        importlib.import_module('mindlab_test_missing')
+    assert values == [42, 42]
+
+
+def test_parse_size() -> None:
+    assert parse_size(1000) == 1000
+    assert parse_size('1000') == 1000
+    assert parse_size('1.5 kB') == 1500
+    assert parse_size('10GB') == 10**10
+    assert parse_size('2 T') == 2 * 10**12
+    with raises(ValueError, match='Invalid size'):
+        parse_size('ten bytes')
+
+
+def test_phase_timer() -> None:
+    timer = PhaseTimer()
+    with timer.phase('first'):
+        pass
+    with raises(RuntimeError), timer.phase('second'):
+        raise RuntimeError('Test')
+    with timer.phase('first'):
+        pass
+    assert list(timer.phases) == ['first', 'second']
+    assert timer.time == sum(timer.phases.values())
+    assert re.fullmatch(r'first: \d+ ms, second: \d+ ms', timer.summary())
+
+
+def test_compact_data_frame() -> None:
+    data = DataFrame({
+        'int': [1, 2, 300, 4],
+        'nullable_int': Series([1, None, 3, 4], dtype='Int64'),
+        'float': [0.5, 1.5, None, 2.0],
+        'precise_float': [0.1, 0.2, 0.3, 0.4],
+        'category': ['a', 'a', 'a', 'b'],
+        'string': ['w', 'x', 'y', 'z'],
+        'object': Series(['w', 'x', None, 'z'], dtype=object),
+        'bool': [True, False, True, True],
+        'arrow': Series([1, 2, 3, 4], dtype=ArrowDtype(pyarrow.int64())),
+    })
+    actual = compact_data_frame(data)
+    assert actual.dtypes.astype(str).to_dict() == {
+        'int': 'int16',
+        'nullable_int': 'Int8',
+        'float': 'float32',
+        'precise_float': 'float64',
+        'category': 'category',
+        'string': 'str',
+        'object': 'string',
+        'bool': 'bool',
+        'arrow': 'int64[pyarrow]',
+    }
+    assert actual.memory_usage(deep=True).sum() < data.memory_usage(deep=True).sum()
+    assert data['int'].dtype == 'int64'  # the original data frame is not changed
+    data = data.drop(columns='object')
+    assert actual.drop(columns='object').astype(data.dtypes).equals(data)